@@ -1,20 +1,40 @@
-from game import Directions, Agent, Actions
-from pacman import GameState
-import random,util,time,math
-import sys
-from featureExtractors import *
+from game import Agent
+import random,time
+from featureCache import FeatureCache, stateKey
+from featureScaling import RunningNormalizer
+from layoutGraph import getLayoutGraph
+from moveBudget import MoveBudget
+from policyMath import softmaxProbabilities
+from profiling import DecisionLatency, PhaseProfiler, isEnabled
 
 # The Actor-Critic Agent class
 class ActorCriticAgent(Agent):
-    def __init__(self, actionFn=None, gamma=0.8, alpha_theta=0.2, alpha_w=0.2, numTraining=100):
+    def __init__(self, actionFn=None, gamma=0.8, alpha_theta=0.2, alpha_w=0.2, numTraining=100, featureCacheSize=10000, parameterStore=None, paramFile=None, normalizeFeatures=False, profile=False, profileFile=None, moveBudget=None):
         if actionFn == None:
             actionFn = lambda state: state.getLegalActions()
         self.actionFn = actionFn
 
         self.theta = [0,0,0,0]
         self.w = [0,0,0,0]
+
+        # With a shared store theta and w are views of shared memory, updates are applied lock free
+        self.parameterStore = None
+        if parameterStore is not None:
+            # Imported here, most runs never touch shared memory or checkpoints
+            from parameterStore import ParameterStore
+            self.parameterStore = ParameterStore.attach(parameterStore)
+            self.theta = self.parameterStore.array('theta')
+            self.w = self.parameterStore.array('w')
+        if paramFile is not None:
+            from parameterStore import loadCheckpoint
+            loadCheckpoint(paramFile, self)
         self.i = 1
 
+        self.featureCache = FeatureCache(featureCacheSize)
+        self.featureScaler = RunningNormalizer(len(self.theta)) if isEnabled(normalizeFeatures) else None
+        self.keyedState = None
+        self.keyedStateKey = None
+
         self.alpha_theta = float(alpha_theta)
         self.alpha_w = float(alpha_w)
 
@@ -25,90 +45,114 @@ class ActorCriticAgent(Agent):
         self.accumTrainRewards = 0
         self.accumTestRewards = 0
 
+        # Opt-in deadline on every decision, late ones fall back to approximated features
+        self.moveBudget = None
+        if moveBudget is not None and float(moveBudget) > 0:
+            self.moveBudget = MoveBudget(moveBudget)
+            self.moveBudget.instrument(self)
+
+        # Every decision is timed, the phase breakdown below is opt-in
+        self.decisionLatency = DecisionLatency()
+        self.decisionLatency.instrument(self)
+
+        self.profiler = None
+        if isEnabled(profile):
+            self.profiler = PhaseProfiler(['getAction', 'softmaxPolicy', 'getFeatureVector', 'extractFeatureVector',
+                'expectedFeatures', 'getValue', 'observeTransition'], profileFile)
+            self.profiler.instrument(self)
+
     def getFeatureVector(self, state, action):
-        # Features inpsired by https://cs229.stanford.edu/proj2017/final-reports/5241109.pdf
-        # extract the grid of food and wall locations and get the ghost locations
-        divideAll = 1
-        food = state.getFood()
-        capsules = state.getCapsules()
-        for capsule in capsules:
-            food[capsule[0]][capsule[1]] = True
+        # Feature vectors only depend on what stateKey covers, so repeated configurations skip extraction
+        if state is not self.keyedState:
+            self.keyedState = state
+            self.keyedStateKey = stateKey(state)
+        key = (self.keyedStateKey, action)
+        approximated = self.moveBudget.approximation(state, action) if self.moveBudget is not None else None
+        if approximated is not None:
+            # Learning from a late decision uses the features it was taken with
+            featureVector = approximated
+        elif self.moveBudget is not None and key not in self.featureCache and not self.moveBudget.canExtract():
+            # Out of time for this move, approximated features are never cached
+            featureVector = self.moveBudget.approximate(action, lambda: self.approximateFeatureVector(state, action))
+        else:
+            featureVector = self.featureCache.lookup(key, lambda: self.extractFeatureVector(state, action))
+        # The cache holds raw features, the running statistics keep moving
+        if self.featureScaler is not None:
+            return self.featureScaler.normalize(featureVector)
+        return featureVector
 
-        walls = state.getWalls()
-        ghosts = state.getGhostPositions()
+    def ghostFeatures(self, state, layoutGraph, nextPosition):
+        """
+          The features that only look at the ghosts, cheap next to the
+          closest food distance
+        """
         activeGhostsPositions = []
         for g in state.getGhostStates():
             if g.scaredTimer <= 3:
                 activeGhostsPositions.append(g.getPosition())
 
-        # compute the location of pacman after he takes the action
-        x, y = state.getPacmanPosition()
-        dx, dy = Actions.directionToVector(action)
-        next_x, next_y = int(x + dx), int(y + dy)
-
-        nDistanceGhosts = sum((next_x, next_y) in Actions.getLegalNeighbors(g, walls) for g in activeGhostsPositions)
+        nDistanceGhosts = sum(nextPosition in layoutGraph.getLegalNeighbors(g) for g in activeGhostsPositions)
 
         eatFood = 0
         if nDistanceGhosts == 0:
             eatFood = 1
 
-        dist = closestFood((next_x, next_y), food, walls)
+        numScaredGhost = sum(g.scaredTimer > 0 for g in state.getGhostStates())
+        return nDistanceGhosts, eatFood, numScaredGhost
+
+    def extractFeatureVector(self, state, action):
+        # Features inpsired by https://cs229.stanford.edu/proj2017/final-reports/5241109.pdf
+        # Cheapest first: the ghost features, then the closest food distance over the food grid
+        divideAll = 1
+        layoutGraph = getLayoutGraph(state.data.layout)
+
+        # compute the location of pacman after he takes the action
+        nextPosition = layoutGraph.getSuccessor(state.getPacmanPosition(), action)
+        nDistanceGhosts, eatFood, numScaredGhost = self.ghostFeatures(state, layoutGraph, nextPosition)
+
+        # extract the grid of food and capsule locations
+        food = state.getFood()
+        capsules = state.getCapsules()
+        for capsule in capsules:
+            food[capsule[0]][capsule[1]] = True
+
+        if self.moveBudget is not None:
+            # The food square lets moves past their budget estimate the distance from other squares
+            dist, foodSquare = layoutGraph.closestFoodSquare(nextPosition, food)
+            self.moveBudget.rememberFood(foodSquare, dist)
+        else:
+            dist = layoutGraph.closestFoodDistance(nextPosition, food)
         if dist is not None:
             closestFoodDist = float(dist)
         else:
-            closestFoodDist = sys.maxsize
+            # Bounded, so preferences stay finite when no food can be reached
+            closestFoodDist = float(layoutGraph.unreachableDistance)
 
-        numScaredGhost = sum(g.scaredTimer > 0 for g in state.getGhostStates())
-
-        return [closestFoodDist / divideAll,
+        featureVector = [closestFoodDist / divideAll,
             nDistanceGhosts / divideAll,
             eatFood / divideAll,
             numScaredGhost /divideAll
         ]
+        if self.featureScaler is not None:
+            self.featureScaler.update(featureVector)
+        return featureVector
+
+    def approximateFeatureVector(self, state, action):
+        """
+          extractFeatureVector for moves past their budget: exact ghost
+          features and the closest food distance estimated by moveBudget
+        """
+        layoutGraph = getLayoutGraph(state.data.layout)
+        nextPosition = layoutGraph.getSuccessor(state.getPacmanPosition(), action)
+        nDistanceGhosts, eatFood, numScaredGhost = self.ghostFeatures(state, layoutGraph, nextPosition)
+        closestFoodDist = float(self.moveBudget.approximateFoodDistance(state, layoutGraph, nextPosition))
+        return [closestFoodDist, nDistanceGhosts, eatFood, numScaredGhost]
 
     def softmaxPolicy(self, state, action):
         # Implementation Help: https://towardsdatascience.com/policy-based-reinforcement-learning-the-easy-way-8de9a3356083
-        numeratorFeatureVector = self.getFeatureVector(state, action)
-
-        if len(numeratorFeatureVector) != len(self.theta):
-            print(f"Theta (Legnth {len(self.theta)}) and Feature Vector (Length {len(numeratorFeatureVector)}) are different lengths.")
-            exit()
-
-        hValue = 0
-        for i in range(len(self.theta)):
-            hValue += self.theta[i] * numeratorFeatureVector[i]
-
-        try:
-            numerator = math.exp(hValue)
-        except:
-            if hValue < 0:
-                numerator = 0
-            else:
-                numerator = sys.maxsize
-
-        denominator = 0
-        for legalAction in self.getLegalActions(state):
-            featureVector = self.getFeatureVector(state, legalAction)
-            hValue = 0
-            for i in range(len(self.theta)):
-                hValue += self.theta[i] * featureVector[i]
-
-            try:
-                denominator += math.exp(hValue)
-            except:
-                if hValue < 0:
-                    denominator += 0
-                else:
-                    denominator += sys.maxsize
-
-        # if numerator == 0:
-        #     print("Numerator is zero: \n\tFeature Vec:", numeratorFeatureVector, "\n\tDenominator: ", denominator,"\n\t Theta: ", thetaVector)
-
-        if denominator == 0:
-            for legalAction in self.getLegalActions(state):
-                featureVector = self.getFeatureVector(state, legalAction)
-                print("Denominator is Zero!\n\tAction:", legalAction, "\n\tFeature Vector:", featureVector)
-        return (numerator / denominator) if denominator != 0 else 0
+        legalActions = self.getLegalActions(state)
+        actionFeatures = [self.getFeatureVector(state, legalAction) for legalAction in legalActions]
+        return softmaxProbabilities(actionFeatures, self.theta)[legalActions.index(action)]
 
     def getAction(self, state):
         actionProbabilities = []
@@ -196,6 +240,10 @@ class ActorCriticAgent(Agent):
         for j in range(len(self.theta)):
             self.theta[j] += self.alpha_theta * self.i * delta * gradientVector[j]
 
+        if self.parameterStore is not None:
+            self.parameterStore.bumpVersion('w')
+            self.parameterStore.bumpVersion('theta')
+
         self.i *= self.gamma
 
 
@@ -227,6 +275,9 @@ class ActorCriticAgent(Agent):
             self.epsilon = 0.0    # no exploration
             self.alpha = 0.0      # no learning
 
+        if self.profiler is not None:
+            self.profiler.endEpisode()
+
     def isInTraining(self):
         print("In training")
         return self.episodesSoFar < self.numTraining
@@ -270,6 +321,9 @@ class ActorCriticAgent(Agent):
 
     def registerInitialState(self, state):
         self.startEpisode()
+        self.decisionLatency.startEpisode(state)
+        if self.moveBudget is not None:
+            self.moveBudget.startEpisode()
         if self.episodesSoFar == 0:
             print('Beginning %d episodes of Training' % (self.numTraining))
 
@@ -280,6 +334,10 @@ class ActorCriticAgent(Agent):
         deltaReward = state.getScore() - self.lastState.getScore()
         self.observeTransition(self.lastState, self.lastAction, state, deltaReward)
         self.stopEpisode()
+        latency = self.decisionLatency.endEpisode()
+        # Training episodes stay quiet, the run summary covers them
+        if self.episodesSoFar > self.numTraining:
+            print('\t%s' % latency)
 
         # Make sure we have this var
         if not 'episodeStartTime' in self.__dict__:
@@ -306,6 +364,12 @@ class ActorCriticAgent(Agent):
             print('\tAverage Rewards for last %d episodes: %.2f'  % (
                     NUM_EPS_UPDATE,windowAvg))
             print('\tEpisode took %.2f seconds' % (time.time() - self.episodeStartTime))
+            print('\t%s' % self.featureCache.summary())
+            print(self.decisionLatency.summary())
+            if self.moveBudget is not None:
+                print('\t%s' % self.moveBudget.summary())
+            if self.profiler is not None:
+                print(self.profiler.summary())
             self.lastWindowAccumRewards = 0.0
             self.episodeStartTime = time.time()
 
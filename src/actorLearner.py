@@ -0,0 +1,188 @@
+import multiprocessing
+import optparse
+import os
+import queue
+import random
+import sys
+import time
+import layout
+import pacman
+from parameterStore import ParameterStore
+from rollouts import playLockstepBatch
+from trajectory import TrajectoryBuffer
+
+def buildGame(config):
+    """
+      Creates the agent, layout and ghosts described by a config dict with
+      the pacman, agentOpts, layout, ghost and numGhosts entries
+    """
+    gameLayout = layout.getLayout(config['layout'])
+    if gameLayout == None:
+        raise Exception("The layout " + config['layout'] + " cannot be found")
+
+    agent = pacman.loadAgent(config['pacman'], True)(**config['agentOpts'])
+    ghostType = pacman.loadAgent(config['ghost'], True)
+    ghosts = [ghostType(i + 1) for i in range(config['numGhosts'])]
+    return agent, gameLayout, ghosts
+
+def actorWorker(workerId, config, storeName, storeLock, episodesStarted, trainingFinished, trajectories):
+    """
+      Plays episodes with the most recently published theta and streams
+      their trajectories to the learner until numGames episodes have been
+      started across all workers.  Episodes past the agent's numTraining
+      wait for trainingFinished, so they all start on the final theta.
+    """
+    if config['seed'] is not None:
+        random.seed('%s-%d' % (config['seed'], workerId))
+
+    agent, gameLayout, ghosts = buildGame(config)
+    store = ParameterStore.attach(storeName, storeLock)
+    seenVersion = -1
+    while True:
+        with episodesStarted.get_lock():
+            if episodesStarted.value >= config['numGames']:
+                break
+            episode = episodesStarted.value
+            episodesStarted.value += 1
+
+        if episode >= agent.numTraining:
+            trainingFinished.wait()
+        if store.version('theta') != seenVersion:
+            theta, seenVersion = store.read('theta')
+            agent.theta = theta.tolist()
+
+        game = playLockstepBatch(agent, gameLayout, ghosts, 1)[0]
+        trajectories.put((seenVersion, game.trajectory.arrays(), game.episodeRewards,
+            game.state.getScore(), game.state.isWin()))
+
+    store.close()
+
+def runActorLearner(config, numWorkers):
+    """
+      Trains a ReinforceAgent with numWorkers actor processes.
+
+      Actors play with a copy of theta and send each finished episode's
+      trajectory to this process, which updates its agent in the order the
+      episodes arrive and publishes the new theta through a ParameterStore.
+      Episodes past the agent's numTraining are played with the final
+      theta and not learned from, like pacman.py's test games: actors only
+      start them once the learner has learned from every training episode
+      and published theta.
+
+      Returns the (score, win) of every episode in learning order and the
+      mean number of theta versions the actors were behind.
+    """
+    agent, _, _ = buildGame(config)
+    if not hasattr(agent, 'trajectory'):
+        raise Exception('The actor/learner mode needs an agent that learns from whole episodes, not ' + config['pacman'])
+
+    storeLock = multiprocessing.Lock()
+    store = ParameterStore.create({'theta': [float(weight) for weight in agent.theta]}, lock=storeLock)
+    episodesStarted = multiprocessing.Value('l', 0)
+    trainingFinished = multiprocessing.Event()
+    trajectories = multiprocessing.Queue()
+    if agent.numTraining <= 0:
+        trainingFinished.set()
+
+    workers = [multiprocessing.Process(target=actorWorker,
+        args=(workerId, config, store.name, storeLock, episodesStarted, trainingFinished, trajectories))
+        for workerId in range(numWorkers)]
+    for worker in workers:
+        worker.start()
+
+    results = []
+    staleness = 0
+    try:
+        while len(results) < config['numGames']:
+            try:
+                version, arrays, episodeRewards, score, win = trajectories.get(timeout=1)
+            except queue.Empty:
+                if not any(worker.is_alive() for worker in workers):
+                    raise Exception('All actors exited before %d episodes were played' % config['numGames'])
+                # The others could be waiting for a training episode the failed actor never sends
+                if any(worker.exitcode not in (None, 0) for worker in workers):
+                    for worker in workers:
+                        worker.terminate()
+                    raise Exception('An actor failed before %d episodes were played' % config['numGames'])
+                continue
+
+            agent.stopEpisode(TrajectoryBuffer.fromArrays(*arrays), episodeRewards)
+            staleness += store.version('theta') - version
+            store.write('theta', [float(weight) for weight in agent.theta])
+            results.append((score, win))
+            # Test episodes only start after numTraining, so every episode learned so far was a training one
+            if len(results) == agent.numTraining:
+                trainingFinished.set()
+
+        for worker in workers:
+            worker.join()
+    finally:
+        store.close()
+
+    return results, staleness / float(len(results))
+
+def readCommand(argv):
+    """
+      Processes the command used to run actor/learner training from the command line.
+    """
+    usageStr = """
+    USAGE:      python actorLearner.py <options>
+    EXAMPLES:   python actorLearner.py -p ReinforceAgent -l smallClassic -n 80 -x 60 -w 4 -a alpha=0.2,gamma=0.8
+    """
+    parser = optparse.OptionParser(usageStr)
+    parser.add_option('-n', '--numGames', dest='numGames', type='int', default=1,
+                      help='the number of games to play', metavar='GAMES')
+    parser.add_option('-w', '--workers', dest='numWorkers', type='int', default=os.cpu_count(),
+                      help='the number of actor processes', metavar='WORKERS')
+    parser.add_option('-l', '--layout', dest='layout', default='mediumClassic',
+                      help='the LAYOUT_FILE from which to load the map layout', metavar='LAYOUT_FILE')
+    parser.add_option('-p', '--pacman', dest='pacman', default='ReinforceAgent',
+                      help='the agent TYPE in the pacmanAgents module to use', metavar='TYPE')
+    parser.add_option('-g', '--ghosts', dest='ghost', default='RandomGhost',
+                      help='the ghost agent TYPE in the ghostAgents module to use', metavar='TYPE')
+    parser.add_option('-k', '--numghosts', type='int', dest='numGhosts', default=4,
+                      help='The maximum number of ghosts to use')
+    parser.add_option('-a', '--agentArgs', dest='agentArgs',
+                      help='Comma separated values sent to agent. e.g. "opt1=val1,opt2,opt3=val3"')
+    parser.add_option('-x', '--numTraining', dest='numTraining', type='int', default=0,
+                      help='How many episodes are training (suppresses output)')
+    parser.add_option('-f', '--fixRandomSeed', action='store_true', dest='fixRandomSeed', default=False,
+                      help='Fixes the random seed to always play the same game')
+
+    options, otherjunk = parser.parse_args(argv)
+    if len(otherjunk) != 0:
+        raise Exception('Command line input not understood: ' + str(otherjunk))
+
+    agentOpts = pacman.parseAgentArgs(options.agentArgs)
+    if options.numTraining > 0 and 'numTraining' not in agentOpts:
+        agentOpts['numTraining'] = options.numTraining
+
+    config = {
+        'pacman': options.pacman,
+        'agentOpts': agentOpts,
+        'layout': options.layout,
+        'ghost': options.ghost,
+        'numGhosts': options.numGhosts,
+        'numGames': options.numGames,
+        'seed': 'cs188' if options.fixRandomSeed else None,
+    }
+    return config, options.numTraining, options.numWorkers
+
+if __name__ == '__main__':
+    config, numTraining, numWorkers = readCommand(sys.argv[1:])
+
+    startTime = time.time()
+    results, staleness = runActorLearner(config, numWorkers)
+    elapsed = time.time() - startTime
+
+    # Like pacman.py, only games played after training are reported
+    testResults = results[numTraining:]
+    if len(testResults) > 0:
+        scores = [score for score, win in testResults]
+        wins = [win for score, win in testResults]
+        print('Average Score:', sum(scores) / float(len(scores)))
+        print('Scores:       ', ', '.join([str(score) for score in scores]))
+        print('Win Rate:      %d/%d (%.2f)' % (wins.count(True), len(wins), wins.count(True) / float(len(wins))))
+        print('Record:       ', ', '.join([['Loss', 'Win'][int(w)] for w in wins]))
+    print('Actors were %.2f theta versions behind on average' % staleness)
+    print('Training took %.2f seconds with %d actors' % (elapsed, numWorkers))
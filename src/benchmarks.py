@@ -0,0 +1,268 @@
+import json
+import optparse
+import os
+import pickle
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import numpy as np
+import layout
+import pacman
+from game import Directions
+from layoutCompiler import LAYOUT_DIR, layoutHash
+from rollouts import LockstepGame
+from trajectory import TrajectoryBuffer
+
+CORPUS_DIR = os.path.join(LAYOUT_DIR, 'corpus')
+
+def recordCorpus(layoutName, numStates=200, seed=0):
+    """
+      Plays seeded games on a layout with a uniformly random pacman and
+      RandomGhosts and returns numStates (state, action, nextState, reward)
+      transitions, where state is what pacman saw when choosing action
+    """
+    gameLayout = layout.getLayout(layoutName)
+    if gameLayout == None:
+        raise Exception("The layout " + layoutName + " cannot be found")
+    ghostType = pacman.loadAgent('RandomGhost', True)
+    ghosts = [ghostType(i + 1) for i in range(gameLayout.getNumGhosts())]
+
+    random.seed(seed)
+    transitions = []
+    while len(transitions) < numStates:
+        game = LockstepGame(gameLayout, ghosts, 0)
+        while not game.isOver() and len(transitions) < numStates:
+            state = game.state.deepCopy()
+            legalActions = state.getLegalPacmanActions()
+            moves = [action for action in legalActions if action != Directions.STOP] or legalActions
+            action = random.choice(moves)
+            reward = game.step(action)
+            transitions.append((state, action, game.state.deepCopy(), reward))
+    return transitions
+
+def loadCorpus(layoutName, numStates=200, seed=0, corpusDir=CORPUS_DIR):
+    """
+      Returns the recorded transitions of a layout, recording and pickling
+      them the first time or when the layout file has changed since
+    """
+    path = os.path.join(corpusDir, '%s-%d-%d.pkl' % (layoutName, numStates, seed))
+    textHash = layoutHash(layout.getLayout(layoutName).layoutText)
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            corpus = pickle.load(f)
+        if corpus['layoutHash'] == textHash:
+            return corpus['transitions']
+
+    transitions = recordCorpus(layoutName, numStates, seed)
+    os.makedirs(corpusDir, exist_ok=True)
+    with open(path, 'wb') as f:
+        pickle.dump({'layoutHash': textHash, 'transitions': transitions}, f, pickle.HIGHEST_PROTOCOL)
+    return transitions
+
+#######################
+# Benchmarks          #
+#######################
+# Each benchmark prepares everything it needs outside the timed region and
+# returns (run, calls, reset): run makes calls calls to the measured method,
+# reset puts back any state run changes so every pass does the same work.
+
+def featureVectorBenchmark(agent, corpus):
+    pairs = [(state, action) for state, _, _, _ in corpus for action in agent.getLegalActions(state)]
+    def run():
+        for state, action in pairs:
+            agent.getFeatureVector(state, action)
+    return run, len(pairs), lambda: None
+
+def softmaxPolicyBenchmark(agent, corpus):
+    pairs = [(state, action) for state, _, _, _ in corpus for action in agent.getLegalActions(state)]
+    def run():
+        for state, action in pairs:
+            agent.softmaxPolicy(state, action)
+    return run, len(pairs), lambda: None
+
+def getActionBenchmark(agent, corpus):
+    states = [state for state, _, _, _ in corpus]
+    def run():
+        for state in states:
+            agent.getAction(state)
+    return run, len(states), agent.startEpisode
+
+def reinforceUpdateBenchmark(agent, corpus):
+    trajectory = TrajectoryBuffer(len(agent.theta))
+    for state, action, _, reward in corpus:
+        legalActions = agent.getLegalActions(state)
+        trajectory.append([agent.getFeatureVector(state, legalAction) for legalAction in legalActions],
+            legalActions.index(action), reward)
+    theta = list(agent.theta)
+    def reset():
+        agent.theta = list(theta)
+    # One update is a pass over the whole trajectory
+    return lambda: agent.update(trajectory), 1, reset
+
+def observeTransitionBenchmark(agent, corpus):
+    theta, w = list(agent.theta), list(agent.w)
+    def run():
+        for state, action, nextState, reward in corpus:
+            agent.observeTransition(state, action, nextState, reward)
+    def reset():
+        agent.theta, agent.w = list(theta), list(w)
+        agent.startEpisode()
+    return run, len(corpus), reset
+
+def qUpdateBenchmark(agent, corpus):
+    weights = agent.weights.copy()
+    def run():
+        for state, action, nextState, reward in corpus:
+            agent.update(state, action, nextState, reward)
+    def reset():
+        agent.weights = weights.copy()
+    return run, len(corpus), reset
+
+BENCHMARKS = [
+    ('ReinforceAgent.getFeatureVector', 'ReinforceAgent', featureVectorBenchmark),
+    ('ReinforceAgent.softmaxPolicy', 'ReinforceAgent', softmaxPolicyBenchmark),
+    ('ReinforceAgent.getAction', 'ReinforceAgent', getActionBenchmark),
+    ('ReinforceAgent.update', 'ReinforceAgent', reinforceUpdateBenchmark),
+    ('ActorCriticAgent.getFeatureVector', 'ActorCriticAgent', featureVectorBenchmark),
+    ('ActorCriticAgent.softmaxPolicy', 'ActorCriticAgent', softmaxPolicyBenchmark),
+    ('ActorCriticAgent.getAction', 'ActorCriticAgent', getActionBenchmark),
+    ('ActorCriticAgent.observeTransition', 'ActorCriticAgent', observeTransitionBenchmark),
+    ('ApproximateQAgent.getAction', 'ApproximateQAgent', getActionBenchmark),
+    ('ApproximateQAgent.update', 'ApproximateQAgent', qUpdateBenchmark),
+]
+
+def createAgent(agentName, featureCacheSize):
+    agentOpts = {'featureCacheSize': featureCacheSize}
+    if agentName == 'ApproximateQAgent':
+        agentOpts['extractor'] = 'SimpleExtractor'
+    return pacman.loadAgent(agentName, True)(**agentOpts)
+
+def timeBenchmark(prepare, agent, corpus, warmup=1, repeats=5, seed=0):
+    """
+      Runs a benchmark warmup + repeats times and returns the statistics
+      of the timed repeats in nanoseconds per call
+    """
+    run, calls, reset = prepare(agent, corpus)
+    times = []
+    for repeat in range(warmup + repeats):
+        reset()
+        random.seed(seed)
+        start = time.perf_counter_ns()
+        run()
+        elapsed = time.perf_counter_ns() - start
+        if repeat >= warmup:
+            times.append(elapsed / float(calls))
+
+    return {
+        'calls': calls,
+        'repeats': repeats,
+        'minNs': min(times),
+        'medianNs': statistics.median(times),
+        'meanNs': statistics.mean(times),
+        'stdevNs': statistics.stdev(times) if len(times) > 1 else 0.0,
+    }
+
+def currentCommit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL).stdout.decode('utf-8').strip() or None
+    except OSError:
+        return None
+
+def runBenchmarks(layoutNames, names=None, numStates=200, warmup=1, repeats=5, featureCacheSize=0, seed=0):
+    results = {
+        'commit': currentCommit(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'numStates': numStates,
+        'seed': seed,
+        'warmup': warmup,
+        'repeats': repeats,
+        'featureCacheSize': featureCacheSize,
+        'results': [],
+    }
+    for layoutName in layoutNames:
+        corpus = loadCorpus(layoutName, numStates, seed)
+        for name, agentName, prepare in BENCHMARKS:
+            if names and not any(pattern in name for pattern in names):
+                continue
+            # A fresh agent per benchmark, so no benchmark warms the caches of another
+            agent = createAgent(agentName, featureCacheSize)
+            stats = timeBenchmark(prepare, agent, corpus, warmup, repeats, seed)
+            stats.update({'benchmark': name, 'layout': layoutName})
+            results['results'].append(stats)
+            print('%-36s %-16s %12.1f us/call (median, stdev %.1f us, %d calls)' % (
+                name, layoutName, stats['medianNs'] / 1000.0, stats['stdevNs'] / 1000.0, stats['calls']))
+    return results
+
+def compareResults(baseline, results):
+    """
+      Prints how each median changed against a results file from an
+      earlier run, returns the ratios keyed by (benchmark, layout)
+    """
+    before = dict(((entry['benchmark'], entry['layout']), entry) for entry in baseline['results'])
+    ratios = {}
+    print('Compared with %s:' % (baseline.get('commit') or 'baseline'))
+    for entry in results['results']:
+        key = (entry['benchmark'], entry['layout'])
+        if key not in before:
+            continue
+        ratios[key] = entry['medianNs'] / before[key]['medianNs']
+        print('\t%-36s %-16s %10.1f -> %10.1f us/call (x%.2f)' % (key[0], key[1],
+            before[key]['medianNs'] / 1000.0, entry['medianNs'] / 1000.0, ratios[key]))
+    return ratios
+
+def readCommand(argv):
+    """
+      Processes the command used to run the benchmarks from the command line.
+    """
+    usageStr = """
+    USAGE:      python benchmarks.py <options>
+    EXAMPLES:   (1) python benchmarks.py -l smallClassic,mediumClassic -o bench.json
+                    - times every benchmark on two layouts and writes the results
+                (2) python benchmarks.py -b ReinforceAgent -c bench.json
+                    - times the ReinforceAgent benchmarks and compares with an earlier run
+    """
+    parser = optparse.OptionParser(usageStr)
+    parser.add_option('-l', '--layouts', dest='layouts', default='smallGrid,smallClassic,mediumClassic',
+                      help='comma separated layouts to benchmark, or all', metavar='LAYOUTS')
+    parser.add_option('-b', '--benchmarks', dest='benchmarks', default=None,
+                      help='only run benchmarks whose name contains one of these comma separated strings')
+    parser.add_option('-n', '--numStates', dest='numStates', type='int', default=200,
+                      help='the number of recorded transitions per layout', metavar='STATES')
+    parser.add_option('-w', '--warmup', dest='warmup', type='int', default=1,
+                      help='untimed passes over the corpus before measuring')
+    parser.add_option('-r', '--repeats', dest='repeats', type='int', default=5,
+                      help='timed passes over the corpus')
+    parser.add_option('-s', '--featureCacheSize', dest='featureCacheSize', type='int', default=0,
+                      help='feature cache size of the agents, 0 times the feature extraction itself')
+    parser.add_option('-o', '--output', dest='output', default=None,
+                      help='write the results as JSON to this file')
+    parser.add_option('-c', '--compare', dest='compare', default=None,
+                      help='compare with a results file written by an earlier run')
+
+    options, otherjunk = parser.parse_args(argv)
+    if len(otherjunk) != 0:
+        raise Exception('Command line input not understood: ' + str(otherjunk))
+
+    if options.layouts == 'all':
+        layoutNames = sorted(f.replace('.lay', '') for f in os.listdir(LAYOUT_DIR) if f.endswith('.lay'))
+    else:
+        layoutNames = options.layouts.split(',')
+    names = options.benchmarks.split(',') if options.benchmarks else None
+    return options, layoutNames, names
+
+if __name__ == '__main__':
+    options, layoutNames, names = readCommand(sys.argv[1:])
+    results = runBenchmarks(layoutNames, names, options.numStates, options.warmup,
+        options.repeats, options.featureCacheSize)
+
+    if options.output is not None:
+        with open(options.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if options.compare is not None:
+        with open(options.compare) as f:
+            compareResults(json.load(f), results)
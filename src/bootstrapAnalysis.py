@@ -0,0 +1,118 @@
+import time
+import numpy as np
+
+def runMeans(scores, lastEpisodes=None):
+    """
+      The mean score of every run of a runs x episodes score array, over
+      its last lastEpisodes episodes when given.  Missing episodes are NaN.
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    if lastEpisodes is not None:
+        scores = scores[:, -lastEpisodes:]
+    return np.nanmean(scores, axis=1)
+
+def pairedBootstrap(means, numResamples=10000, confidence=0.95, rng=None):
+    """
+      Paired bootstrap of every pair of agents at once.
+
+      means: agents x runs array of run means, where run i of every agent
+      was played with the same seed (or the runs are simply matched by
+      index).  Every resample draws the same runs for all agents, so the
+      differences keep the pairing.
+
+      Returns agents x agents arrays of the mean difference (row minus
+      column), the bounds of its confidence interval and the two-sided
+      p-value of a zero difference.
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    numRuns = means.shape[1]
+    resamples = rng.integers(0, numRuns, size=(numResamples, numRuns))
+
+    # agents x resamples
+    resampledMeans = means[:, resamples].mean(axis=2)
+    # agents x agents x resamples
+    resampledDifferences = resampledMeans[:, np.newaxis, :] - resampledMeans[np.newaxis, :, :]
+    differences = means.mean(axis=1)
+    differences = differences[:, np.newaxis] - differences[np.newaxis, :]
+
+    tail = (1 - confidence) / 2.0
+    lower, upper = np.quantile(resampledDifferences, [tail, 1 - tail], axis=2)
+    # Centering the resampled differences on zero gives their distribution under the null hypothesis
+    centered = resampledDifferences - differences[:, :, np.newaxis]
+    pValues = (np.abs(centered) >= np.abs(differences)[:, :, np.newaxis]).mean(axis=2)
+    pValues = np.maximum(pValues, 1.0 / numResamples)
+    return differences, lower, upper, pValues
+
+def holm(pValues):
+    """
+      Holm-Bonferroni adjusted p-values of a family of tests
+    """
+    pValues = np.asarray(pValues, dtype=np.float64)
+    order = np.argsort(pValues)
+    adjusted = np.maximum.accumulate(pValues[order] * (len(pValues) - np.arange(len(pValues))))
+    result = np.empty_like(adjusted)
+    result[order] = np.minimum(adjusted, 1.0)
+    return result
+
+def analyzeCells(cells, numResamples=10000, confidence=0.95, alpha=0.05, lastEpisodes=None, seed=0):
+    """
+      Compares every pair of agents in every (layout, ghosts) cell.
+
+      cells: dict from (layoutName, numGhosts) to a dict from agent name to
+      its runs x episodes score array.  Runs are paired by index, agents
+      with more runs than the others in a cell are cut to the common count.
+
+      Holm's correction is applied over every comparison of every cell, so
+      alpha bounds the chance of any false significant difference in the
+      whole matrix.  Returns a list of dicts, one per comparison.
+    """
+    rng = np.random.default_rng(seed)
+    comparisons = []
+    for (layoutName, numGhosts), agentScores in sorted(cells.items()):
+        agentNames = sorted(agentScores)
+        numRuns = min(len(agentScores[agentName]) for agentName in agentNames)
+        if len(agentNames) < 2 or numRuns < 2:
+            continue
+        means = np.array([runMeans(agentScores[agentName][:numRuns], lastEpisodes) for agentName in agentNames])
+        differences, lower, upper, pValues = pairedBootstrap(means, numResamples, confidence, rng)
+
+        rows, columns = np.triu_indices(len(agentNames), 1)
+        for row, column in zip(rows, columns):
+            comparisons.append({
+                "layout": layoutName,
+                "numGhosts": numGhosts,
+                "agents": (agentNames[row], agentNames[column]),
+                "runs": numRuns,
+                "mean_difference": float(differences[row, column]),
+                "interval": (float(lower[row, column]), float(upper[row, column])),
+                "p_value": float(pValues[row, column]),
+            })
+
+    adjusted = holm([comparison["p_value"] for comparison in comparisons])
+    for comparison, p_value in zip(comparisons, adjusted):
+        comparison["adjusted_p_value"] = float(p_value)
+        comparison["significant"] = p_value < alpha
+    return comparisons
+
+def printComparisons(comparisons, confidence=0.95):
+    for comparison in comparisons:
+        key1, key2 = comparison["agents"]
+        print(f'{comparison["layout"]} with {comparison["numGhosts"]} ghosts: {key1} vs {key2} over {comparison["runs"]} paired runs')
+        print("Mean difference: %.2f (%d%% CI %.2f to %.2f)" % ((comparison["mean_difference"], round(100 * confidence)) + comparison["interval"]))
+        print("P-value: %.4g (Holm adjusted %.4g)" % (comparison["p_value"], comparison["adjusted_p_value"]))
+        print("Significant:", comparison["significant"])
+        print()
+
+if __name__ == '__main__':
+    # Times the analysis of a synthetic full layout x ghosts matrix
+    rng = np.random.default_rng(0)
+    cells = {}
+    for layoutName in ['smallGrid', 'smallClassic', 'mediumClassic', 'originalClassic']:
+        for numGhosts in [1, 2, 3, 4]:
+            cells[(layoutName, numGhosts)] = dict((agentName, rng.normal(offset, 200.0, size=(48, 500)))
+                for agentName, offset in [('ReinforceAgent', 0.0), ('ApproximateQAgent', 30.0), ('ActorCriticAgent', 5.0)])
+    startTime = time.time()
+    comparisons = analyzeCells(cells)
+    print('Analyzed %d comparisons in %d cells in %.2f seconds, %d significant' % (
+        len(comparisons), len(cells), time.time() - startTime, sum(comparison["significant"] for comparison in comparisons)))
@@ -0,0 +1,224 @@
+import json
+import optparse
+import os
+import random
+import sys
+import layout
+import pacman
+import textDisplay
+
+# Agents from README.md and the arguments they are run with, shared by the sweep and benchmark scripts
+AGENTS = {
+    'ReinforceAgent': 'alpha=0.2,gamma=0.8',
+    'ApproximateQAgent': 'extractor=SimpleExtractor',
+    'ActorCriticAgent': 'alpha_theta=0.25,alpha_w=0.15,gamma=0.9',
+}
+
+class SeededAgent:
+    """
+      Makes an agent draw from its own random stream.  The agents use the
+      random module directly, so the module's state is swapped for the
+      stream's around every getAction.  Everything else is passed through.
+    """
+    def __init__(self, agent, seed):
+        self.agent = agent
+        self.randomState = random.Random(seed).getstate()
+
+    def __getattr__(self, name):
+        return getattr(self.agent, name)
+
+    def getAction(self, state):
+        outerState = random.getstate()
+        random.setstate(self.randomState)
+        try:
+            return self.agent.getAction(state)
+        finally:
+            self.randomState = random.getstate()
+            random.setstate(outerState)
+
+# Learning counters of the agents, and the rates ReinforcementAgent zeroes after training,
+# restored along with their parameters
+AGENT_COUNTERS = ['episodesSoFar', 'accumTrainRewards', 'accumTestRewards', 'epsilon', 'alpha']
+
+def randomState(state):
+    """
+      A random module state read back from JSON, which turns tuples into lists
+    """
+    return (state[0], tuple(state[1]), state[2])
+
+def saveRunCheckpoint(path, agent, seed, ghosts, gamesPlayed, scores, recorder=None):
+    """
+      Writes everything a run needs to continue after gamesPlayed games:
+      the agent's parameters and learning counters, the scores (and
+      recorded episodes) so far and the state of every random stream
+    """
+    from parameterStore import agentParameters
+    checkpoint = {
+        'agent': type(agent).__name__,
+        'seed': seed,
+        'parameters': agentParameters(agent),
+        'counters': dict((name, getattr(agent, name)) for name in AGENT_COUNTERS if hasattr(agent, name)),
+        'gamesPlayed': gamesPlayed,
+        'scores': scores,
+        'pacmanRandomState': random.getstate(),
+        'ghostRandomStates': [ghost.randomState for ghost in ghosts],
+        'episodes': recorder.rows if recorder is not None else [],
+    }
+    # Written to a temporary file and renamed so a crash never leaves half a checkpoint
+    with open(path + '.tmp', 'w') as f:
+        json.dump(checkpoint, f)
+    os.replace(path + '.tmp', path)
+
+def loadRunCheckpoint(path, agent, seed, ghosts, recorder=None):
+    """
+      Restores a checkpoint from saveRunCheckpoint, returns the number of
+      games played and their scores
+    """
+    from parameterStore import setAgentParameters
+    with open(path) as f:
+        checkpoint = json.load(f)
+    if checkpoint['agent'] != type(agent).__name__:
+        raise Exception('%s holds a run of a %s, not a %s' % (path, checkpoint['agent'], type(agent).__name__))
+    if checkpoint['seed'] != seed:
+        raise Exception('%s holds a run with seed %s, not %s' % (path, checkpoint['seed'], seed))
+    setAgentParameters(agent, checkpoint['parameters'])
+    for name, value in checkpoint['counters'].items():
+        setattr(agent, name, value)
+    random.setstate(randomState(checkpoint['pacmanRandomState']))
+    for ghost, state in zip(ghosts, checkpoint['ghostRandomStates']):
+        ghost.randomState = randomState(state)
+    if recorder is not None:
+        recorder.rows = checkpoint['episodes']
+    return checkpoint['gamesPlayed'], checkpoint['scores']
+
+def runExperiment(agentName, agentOpts, layoutName, numGhosts, numGames, numTraining=0, seed=0, ghostType='RandomGhost',
+        checkpointFile=None, checkpointEvery=0, resultsDir=None, keepCheckpoint=False):
+    """
+      Plays numGames games with common random numbers: every ghost draws
+      from its own stream seeded by (seed, ghost index) and pacman from the
+      random module seeded by seed.  Runs of different agents with the
+      same seed face ghosts rolling the same dice, which makes their
+      scores positively correlated and paired comparisons much sharper.
+
+      With a checkpointFile and checkpointEvery, the run is saved to the
+      file every checkpointEvery games and continues from it when the file
+      exists, drawing the same random numbers as a run that never stopped.
+      Agents with normalizeFeatures cannot be checkpointed.
+      The file is removed once the run is done, unless keepCheckpoint is
+      set, which saves the finished run so a longer one can continue it.
+
+      With a resultsDir, the score, win, steps, time and parameters of
+      every episode are added to the ResultsStore there.
+
+      Returns the scores of the games after numTraining, like pacman.py.
+    """
+    gameLayout = layout.getLayout(layoutName)
+    if gameLayout == None:
+        raise Exception("The layout " + layoutName + " cannot be found")
+
+    random.seed('%s-pacman' % seed)
+    agent = pacman.loadAgent(agentName, True)(**agentOpts)
+    ghostAgent = pacman.loadAgent(ghostType, True)
+    ghosts = [SeededAgent(ghostAgent(i + 1), '%s-ghost-%d' % (seed, i + 1)) for i in range(numGhosts)]
+
+    # Checkpoints and the results store are imported where they are used, plain runs start faster without them
+    recorder = None
+    if resultsDir is not None:
+        from resultsStore import EpisodeRecorder
+        recorder = EpisodeRecorder(agent)
+    player = recorder if recorder is not None else agent
+
+    if checkpointFile is None or checkpointEvery <= 0:
+        games = pacman.runGames(gameLayout, player, ghosts, textDisplay.NullGraphics(), numGames, False, numTraining)
+        scores = [game.state.getScore() for game in games]
+    else:
+        # The running feature statistics are not checkpointed and move with the feature cache's
+        # misses, which start over after a resume, so such a run could not continue identically
+        if getattr(agent, 'featureScaler', None) is not None:
+            raise Exception('Runs with normalizeFeatures cannot be checkpointed, play them without -c')
+        gamesPlayed, scores = 0, []
+        if os.path.exists(checkpointFile):
+            gamesPlayed, scores = loadRunCheckpoint(checkpointFile, agent, seed, ghosts, recorder)
+            print('Continuing from %s after %d games' % (checkpointFile, gamesPlayed))
+
+        while gamesPlayed < numGames:
+            count = min(checkpointEvery, numGames - gamesPlayed)
+            games = pacman.runGames(gameLayout, player, ghosts, textDisplay.NullGraphics(), count, False,
+                min(max(numTraining - gamesPlayed, 0), count))
+            gamesPlayed += count
+            scores.extend(game.state.getScore() for game in games)
+            if gamesPlayed < numGames:
+                saveRunCheckpoint(checkpointFile, agent, seed, ghosts, gamesPlayed, scores, recorder)
+        if keepCheckpoint:
+            saveRunCheckpoint(checkpointFile, agent, seed, ghosts, gamesPlayed, scores, recorder)
+        elif os.path.exists(checkpointFile):
+            os.remove(checkpointFile)
+
+        # Every chunk printed its own scores, the stats scripts read the last Scores: line
+        if len(scores) > 0:
+            print('Average Score:', sum(scores) / float(len(scores)))
+            print('Scores:       ', ', '.join([str(score) for score in scores]))
+
+    if recorder is not None:
+        from resultsStore import ResultsStore, parameterNames
+        from resultCache import experimentKey
+        # Named by the run's configuration, so replaying a run replaces it rather than counting it twice
+        agentArgs = ','.join('%s=%s' % (name, value) for name, value in sorted(agentOpts.items()))
+        key = experimentKey(agentName, agentArgs, layoutName, numGhosts, numGames, numTraining, seed, ghostType)
+        runId = '%s-%s-%d-%s-%s' % (agentName, layoutName, numGhosts, seed, key[:16])
+        ResultsStore(resultsDir).addRun(runId, recorder.rows, agent=agentName, agentOpts=agentOpts, layout=layoutName,
+            numGhosts=numGhosts, seed=seed, numTraining=numTraining, parameterNames=parameterNames(agentName))
+    return scores
+
+def readCommand(argv):
+    """
+      Processes the command used to run a seeded experiment from the command line.
+    """
+    usageStr = """
+    USAGE:      python experiments.py <options>
+    EXAMPLES:   python experiments.py -p ReinforceAgent -l smallClassic -k 2 -n 100 -s 7 -a alpha=0.2,gamma=0.8
+                - plays 100 games whose ghost dice are shared by every agent run with seed 7
+    """
+    parser = optparse.OptionParser(usageStr)
+    parser.add_option('-n', '--numGames', dest='numGames', type='int', default=1,
+                      help='the number of games to play', metavar='GAMES')
+    parser.add_option('-l', '--layout', dest='layout', default='mediumClassic',
+                      help='the LAYOUT_FILE from which to load the map layout', metavar='LAYOUT_FILE')
+    parser.add_option('-p', '--pacman', dest='pacman', default='ReinforceAgent',
+                      help='the agent TYPE in the pacmanAgents module to use', metavar='TYPE')
+    parser.add_option('-g', '--ghosts', dest='ghost', default='RandomGhost',
+                      help='the ghost agent TYPE in the ghostAgents module to use', metavar='TYPE')
+    parser.add_option('-k', '--numghosts', type='int', dest='numGhosts', default=4,
+                      help='The maximum number of ghosts to use')
+    parser.add_option('-a', '--agentArgs', dest='agentArgs',
+                      help='Comma separated values sent to agent. e.g. "opt1=val1,opt2,opt3=val3"')
+    parser.add_option('-x', '--numTraining', dest='numTraining', type='int', default=0,
+                      help='How many episodes are training (suppresses output)')
+    parser.add_option('-s', '--seed', dest='seed', default='0',
+                      help='the seed of the common random number streams')
+    parser.add_option('-c', '--checkpointFile', dest='checkpointFile', default=None,
+                      help='save the run to this file every --checkpointEvery games and continue from it if it exists')
+    parser.add_option('--checkpointEvery', dest='checkpointEvery', type='int', default=0,
+                      help='the number of games between checkpoints')
+    parser.add_option('--keepCheckpoint', action='store_true', dest='keepCheckpoint', default=False,
+                      help='save the finished run to the checkpoint file instead of removing it')
+    parser.add_option('-o', '--results', dest='resultsDir', default=None,
+                      help='add the per-episode results of the run to the results store in this directory')
+    parser.add_option('-q', '--quietTextGraphics', action='store_true', dest='quietGraphics', default=False,
+                      help='Accepted for compatibility with pacman.py, there are never graphics')
+
+    options, otherjunk = parser.parse_args(argv)
+    if len(otherjunk) != 0:
+        raise Exception('Command line input not understood: ' + str(otherjunk))
+
+    agentOpts = pacman.parseAgentArgs(options.agentArgs)
+    if options.numTraining > 0 and 'numTraining' not in agentOpts:
+        agentOpts['numTraining'] = options.numTraining
+    return options, agentOpts
+
+if __name__ == '__main__':
+    options, agentOpts = readCommand(sys.argv[1:])
+    # pacman.runGames prints the Scores: line the stats scripts read
+    runExperiment(options.pacman, agentOpts, options.layout, options.numGhosts, options.numGames,
+        options.numTraining, options.seed, options.ghost, options.checkpointFile, options.checkpointEvery,
+        options.resultsDir, options.keepCheckpoint)
@@ -0,0 +1,92 @@
+from collections import OrderedDict
+import itertools
+from layoutCompiler import layoutKey
+
+class FeatureCache:
+    """
+      Least-recently-used cache of feature vectors shared across episodes.
+
+      maxSize - number of entries kept before the least recently used one
+                is evicted, 0 disables the cache
+    """
+    def __init__(self, maxSize=10000):
+        self.maxSize = int(maxSize)
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def lookup(self, key, computeFn):
+        """
+          Returns the cached value for key, calling computeFn() and
+          storing its result on a miss
+        """
+        if self.maxSize <= 0:
+            return computeFn()
+
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+        self.misses += 1
+        value = computeFn()
+        self.entries[key] = value
+        if len(self.entries) > self.maxSize:
+            self.entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        self.entries.clear()
+
+    def hitRate(self):
+        lookups = self.hits + self.misses
+        return self.hits / float(lookups) if lookups > 0 else 0.0
+
+    def summary(self):
+        return 'Feature cache: %d hits, %d misses (%.2f hit rate), %d/%d entries' % (
+            self.hits, self.misses, self.hitRate(), len(self.entries), self.maxSize)
+
+def scaredLevel(scaredTimer):
+    """
+      The extractors only care whether a ghost is scared at all and whether
+      it is about to become active again (scaredTimer <= 3)
+    """
+    if scaredTimer == 0:
+        return 0
+    return 1 if scaredTimer <= 3 else 2
+
+def stateKey(state):
+    """
+      Compact hashable key that covers every input the feature extractors
+      read: the layout, pacman's position, the food and capsules left and
+      each ghost's position and scared level.  The layout is keyed by its
+      content, every state an agent sees carries its own copy of it.
+    """
+    food = state.getFood()
+    ghosts = tuple((g.getPosition(), scaredLevel(g.scaredTimer)) for g in state.getGhostStates())
+    return (layoutKey(state.data.layout.layoutText),
+        state.getPacmanPosition(),
+        bytes(itertools.chain.from_iterable(food.data)),
+        tuple(state.getCapsules()),
+        ghosts)
+
+if __name__ == '__main__':
+    # The same position in two episodes must share a key, even though every state carries its own layout copy
+    import layout
+    from pacman import GameState
+
+    cache = FeatureCache()
+    for episode in range(2):
+        state = GameState()
+        state.initialize(layout.getLayout('smallClassic'), 2)
+        observation = state.deepCopy()
+        cache.lookup(stateKey(observation), lambda: episode)
+    if cache.hits != 1:
+        raise Exception('The second episode missed the cache: ' + cache.summary())
+    print(cache.summary())
@@ -0,0 +1,30 @@
+import math
+
+class RunningNormalizer:
+    """
+      Standardizes feature vectors with a running mean and variance,
+      updated one vector at a time with Welford's algorithm so no history
+      is kept and the variance never goes negative from cancellation.
+      Features that have not varied yet are only centered.
+    """
+    def __init__(self, numFeatures, epsilon=1e-8):
+        self.count = 0
+        self.mean = [0.0] * numFeatures
+        self.m2 = [0.0] * numFeatures
+        self.epsilon = epsilon
+        self.scales = [1.0] * numFeatures
+
+    def update(self, featureVector):
+        self.count += 1
+        for i, value in enumerate(featureVector):
+            delta = value - self.mean[i]
+            self.mean[i] += delta / self.count
+            self.m2[i] += delta * (value - self.mean[i])
+            variance = self.m2[i] / self.count
+            self.scales[i] = 1.0 / math.sqrt(variance) if variance > self.epsilon else 1.0
+
+    def variance(self):
+        return [m2 / self.count if self.count > 0 else 0.0 for m2 in self.m2]
+
+    def normalize(self, featureVector):
+        return [(value - mean) * scale for value, mean, scale in zip(featureVector, self.mean, self.scales)]
@@ -0,0 +1,215 @@
+import concurrent.futures
+import math
+import optparse
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import numpy as np
+from layoutCompiler import LAYOUT_DIR, compileLayoutFile
+
+# Ranges the agent arguments are sampled from, as (low, high, log scale)
+SEARCH_SPACES = {
+    'ReinforceAgent': {
+        'alpha': (0.01, 1.0, True),
+        'gamma': (0.5, 0.99, False),
+    },
+    'ActorCriticAgent': {
+        'alpha_theta': (0.01, 1.0, True),
+        'alpha_w': (0.01, 1.0, True),
+        'gamma': (0.5, 0.99, False),
+    },
+    'ApproximateQAgent': {
+        'alpha': (0.01, 1.0, True),
+        'epsilon': (0.01, 0.3, True),
+        'gamma': (0.5, 0.99, False),
+    },
+}
+
+# Arguments every configuration of an agent is run with
+FIXED_ARGS = {
+    'ApproximateQAgent': 'extractor=SimpleExtractor',
+}
+
+def sampleConfiguration(agentName, rng):
+    """
+      Agent arguments drawn uniformly from SEARCH_SPACES, log-uniformly for
+      learning rates
+    """
+    configuration = {}
+    for name, (low, high, logScale) in SEARCH_SPACES[agentName].items():
+        if logScale:
+            configuration[name] = math.exp(rng.uniform(math.log(low), math.log(high)))
+        else:
+            configuration[name] = rng.uniform(low, high)
+    return configuration
+
+def agentArgs(agentName, configuration, numTraining=None):
+    """
+      The -a argument of a configuration.  Runs pass numTraining so the
+      agent keeps learning through every rung, otherwise it zeroes alpha
+      and epsilon after its default number of training games.
+    """
+    args = ['%s=%.4g' % (name, value) for name, value in sorted(configuration.items())]
+    if agentName in FIXED_ARGS:
+        args.insert(0, FIXED_ARGS[agentName])
+    if numTraining is not None:
+        args.append('numTraining=%d' % numTraining)
+    return ','.join(args)
+
+def rungBudgets(minGames, maxGames, eta):
+    """
+      Games per run at every rung, growing by eta up to maxGames
+    """
+    budgets = [minGames]
+    while budgets[-1] * eta < maxGames:
+        budgets.append(budgets[-1] * eta)
+    if budgets[-1] < maxGames:
+        budgets.append(maxGames)
+    return budgets
+
+def curveScore(scores):
+    """
+      How well a partial learning curve is doing: the mean score of its
+      later half, which rewards configurations that have learnt rather
+      than ones with a lucky start
+    """
+    return float(np.mean(scores[len(scores) // 2:]))
+
+class SuccessiveHalving:
+    """
+      Successive halving over sampled agent configurations on one layout.
+
+      Every configuration plays numRuns seeded runs (seed + run index, the
+      same seeds for every configuration) of budgets[0] games.  Only the
+      best 1/eta by curveScore go on to the next rung, where their runs
+      continue from checkpoints up to the next budget, so no game is played
+      twice and most of the compute goes to configurations that look
+      promising.
+    """
+    def __init__(self, agentName, layoutName, numGhosts, configurations, budgets, eta=3, numRuns=2, seed=0, numWorkers=None):
+        self.agentName = agentName
+        self.layoutName = layoutName
+        self.numGhosts = numGhosts
+        self.configurations = configurations
+        self.budgets = budgets
+        self.eta = eta
+        self.numRuns = numRuns
+        self.seed = seed
+        self.numWorkers = numWorkers or os.cpu_count()
+        self.checkpointDir = tempfile.mkdtemp(prefix='halving-')
+        self.gamesPlayed = 0
+
+    def checkpointFile(self, candidate, runIndex):
+        return os.path.join(self.checkpointDir, '%d-%d.json' % (candidate, runIndex))
+
+    def playRun(self, candidate, runIndex, numGames):
+        """
+          Continues run runIndex of a configuration up to numGames games and
+          returns the scores of all of them
+        """
+        command = ['python', 'experiments.py', '-p', self.agentName,
+            '-a', agentArgs(self.agentName, self.configurations[candidate], self.budgets[-1]), '-l', self.layoutName,
+            '-k', str(self.numGhosts), '-n', str(numGames), '-s', str(self.seed + runIndex),
+            '-c', self.checkpointFile(candidate, runIndex), '--checkpointEvery', str(numGames), '--keepCheckpoint']
+        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+        scores = []
+        for line in result.stdout.decode('utf-8').splitlines():
+            if 'Scores:' in line:
+                scores = [float(value) for value in line.split(':')[1].strip().split(', ')]
+        if not scores:
+            raise Exception('The run of %s failed: %s' % (command, result.stderr.decode('utf-8').strip()))
+        return scores
+
+    def run(self):
+        """
+          Returns the surviving configuration's index and the curve score of
+          every configuration at the last rung it reached
+        """
+        candidates = list(range(len(self.configurations)))
+        results = {}
+        played = 0
+        try:
+            with concurrent.futures.ThreadPoolExecutor(self.numWorkers) as executor:
+                for rung, budget in enumerate(self.budgets):
+                    runs = [(candidate, runIndex) for candidate in candidates for runIndex in range(self.numRuns)]
+                    scores = dict(zip(runs, executor.map(lambda run: self.playRun(run[0], run[1], budget), runs)))
+                    self.gamesPlayed += len(runs) * (budget - played)
+                    played = budget
+
+                    for candidate in candidates:
+                        results[candidate] = np.mean([curveScore(scores[(candidate, runIndex)]) for runIndex in range(self.numRuns)])
+                    candidates.sort(key=lambda candidate: results[candidate], reverse=True)
+                    print('Rung %d, %d games: %d configurations, best %.1f (%s)' % (rung, budget, len(candidates),
+                        results[candidates[0]], agentArgs(self.agentName, self.configurations[candidates[0]])))
+                    if rung < len(self.budgets) - 1:
+                        candidates = candidates[:max(1, len(candidates) // self.eta)]
+        finally:
+            shutil.rmtree(self.checkpointDir, ignore_errors=True)
+        return candidates[0], results
+
+def readCommand(argv):
+    """
+      Processes the command used to tune agent arguments from the command line.
+    """
+    usageStr = """
+    USAGE:      python hyperparameterSearch.py <options>
+    EXAMPLES:   (1) python hyperparameterSearch.py -p ReinforceAgent -l smallClassic,mediumClassic
+                    - tunes alpha and gamma of REINFORCE on two layouts
+                (2) python hyperparameterSearch.py -p ActorCriticAgent -c 81 --minGames 10 --maxGames 810 -e 3
+                    - 81 configurations, a third of them continuing at every rung
+    """
+    parser = optparse.OptionParser(usageStr)
+    parser.add_option('-p', '--pacman', dest='pacman', default='ReinforceAgent',
+                      help='the agent to tune: ' + ', '.join(SEARCH_SPACES), metavar='TYPE')
+    parser.add_option('-l', '--layouts', dest='layouts', default='mediumClassic',
+                      help='comma separated layouts to tune on, each gets its own search')
+    parser.add_option('-k', '--numghosts', type='int', dest='numGhosts', default=2,
+                      help='the number of ghosts')
+    parser.add_option('-c', '--configurations', dest='numConfigurations', type='int', default=27,
+                      help='the number of configurations sampled')
+    parser.add_option('--minGames', dest='minGames', type='int', default=20,
+                      help='the games every configuration plays at the first rung')
+    parser.add_option('--maxGames', dest='maxGames', type='int', default=500,
+                      help='the games the surviving configurations play')
+    parser.add_option('-e', '--eta', dest='eta', type='int', default=3,
+                      help='one in eta configurations continues to the next rung')
+    parser.add_option('-r', '--runs', dest='numRuns', type='int', default=2,
+                      help='the seeded runs every configuration plays')
+    parser.add_option('-s', '--seed', dest='seed', type='int', default=0,
+                      help='seeds the sampling and the runs')
+    parser.add_option('-j', '--workers', dest='numWorkers', type='int', default=os.cpu_count(),
+                      help='the number of runs played at once')
+
+    options, otherjunk = parser.parse_args(argv)
+    if len(otherjunk) != 0:
+        raise Exception('Command line input not understood: ' + str(otherjunk))
+    if options.pacman not in SEARCH_SPACES:
+        raise Exception('No search space for the agent ' + options.pacman)
+    return options
+
+if __name__ == '__main__':
+    options = readCommand(sys.argv[1:])
+    rng = random.Random(options.seed)
+    configurations = [sampleConfiguration(options.pacman, rng) for _ in range(options.numConfigurations)]
+    budgets = rungBudgets(options.minGames, options.maxGames, options.eta)
+
+    best = {}
+    for layoutName in options.layouts.split(','):
+        compileLayoutFile(os.path.join(LAYOUT_DIR, layoutName + '.lay'))
+        print('Tuning %s on %s with %d ghosts, %d configurations over rungs of %s games' % (
+            options.pacman, layoutName, options.numGhosts, len(configurations), budgets))
+        search = SuccessiveHalving(options.pacman, layoutName, options.numGhosts, configurations, budgets,
+            options.eta, options.numRuns, options.seed, options.numWorkers)
+        winner, results = search.run()
+        fullGames = len(configurations) * options.numRuns * budgets[-1]
+        print('Played %d games, %.0f%% of running every configuration to %d games' % (
+            search.gamesPlayed, 100.0 * search.gamesPlayed / fullGames, budgets[-1]))
+        best[layoutName] = (agentArgs(options.pacman, configurations[winner]), results[winner])
+
+    print('Best settings:')
+    for layoutName, (args, score) in best.items():
+        print('\t%-16s -a %s (mean score %.1f over the last half of %d games)' % (layoutName, args, score, budgets[-1]))
@@ -0,0 +1,114 @@
+import json
+import optparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Modules every worker process or harness run imports before doing any work
+ENTRY_POINTS = ['reinforceAgents', 'actorCriticAgents', 'qlearningAgents', 'experiments', 'stats_multi']
+
+def importTimes(module):
+    """
+      Imports a module in a fresh interpreter with -X importtime and returns
+      (name, depth, self us, cumulative us) for every module it loaded, in
+      the order Python reports them (children before their parent)
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, cwd=SOURCE_DIR)
+    if result.returncode != 0:
+        raise Exception('Importing %s failed: %s' % (module, result.stderr.decode('utf-8').strip().splitlines()[-1]))
+
+    times = []
+    for line in result.stderr.decode('utf-8').splitlines():
+        if not line.startswith('import time:'):
+            continue
+        selfTime, cumulative, name = line[len('import time:'):].split('|')
+        try:
+            selfTime, cumulative = int(selfTime), int(cumulative)
+        except ValueError:
+            # The header line
+            continue
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        times.append((name.strip(), depth, selfTime, cumulative))
+    return times
+
+def coldStart(module, repeats):
+    """
+      Median wall time in seconds of starting an interpreter and importing
+      the module, what every worker process pays before its first step
+    """
+    seconds = []
+    for _ in range(repeats):
+        startTime = time.perf_counter()
+        subprocess.run([sys.executable, '-c', 'import ' + module], stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL, cwd=SOURCE_DIR, check=True)
+        seconds.append(time.perf_counter() - startTime)
+    return statistics.median(seconds)
+
+def profileModule(module, repeats, top):
+    times = importTimes(module)
+    total = [cumulative for name, depth, selfTime, cumulative in times if name == module and depth == 0][0]
+    # What the module pulls in itself, the heaviest first
+    children = sorted([(cumulative, name) for name, depth, selfTime, cumulative in times if depth == 1], reverse=True)
+    return {
+        'coldStartMs': 1000.0 * coldStart(module, repeats),
+        'importMs': total / 1000.0,
+        'modules': len(times),
+        'heaviest': [(name, cumulative / 1000.0) for cumulative, name in children[:top]],
+    }
+
+def readCommand(argv):
+    """
+      Processes the command used to profile imports from the command line.
+    """
+    usageStr = """
+    USAGE:      python importProfile.py <options>
+    EXAMPLES:   (1) python importProfile.py -o imports.json
+                    - profiles the entry points and saves the numbers
+                (2) python importProfile.py -b imports.json
+                    - profiles again and compares with the saved numbers
+    """
+    parser = optparse.OptionParser(usageStr)
+    parser.add_option('-m', '--modules', dest='modules', default=','.join(ENTRY_POINTS),
+                      help='comma separated modules to profile')
+    parser.add_option('-r', '--repeats', dest='repeats', type='int', default=5,
+                      help='the cold starts timed per module')
+    parser.add_option('-n', '--top', dest='top', type='int', default=5,
+                      help='the heaviest direct imports listed per module')
+    parser.add_option('-o', '--output', dest='output', default=None,
+                      help='save the profile to this JSON file')
+    parser.add_option('-b', '--baseline', dest='baseline', default=None,
+                      help='compare with a profile saved with -o')
+
+    options, otherjunk = parser.parse_args(argv)
+    if len(otherjunk) != 0:
+        raise Exception('Command line input not understood: ' + str(otherjunk))
+    return options
+
+if __name__ == '__main__':
+    options = readCommand(sys.argv[1:])
+    baseline = None
+    if options.baseline is not None:
+        with open(options.baseline) as f:
+            baseline = json.load(f)
+
+    profiles = {}
+    for module in options.modules.split(','):
+        profile = profileModule(module, options.repeats, options.top)
+        profiles[module] = profile
+        line = '%-18s cold start %7.1f ms, imports %7.1f ms over %d modules' % (
+            module, profile['coldStartMs'], profile['importMs'], profile['modules'])
+        if baseline is not None and module in baseline:
+            before = baseline[module]['coldStartMs']
+            line += ' (cold start %+.1f%% against %.1f ms)' % (100.0 * (profile['coldStartMs'] - before) / before, before)
+        print(line)
+        for name, milliseconds in profile['heaviest']:
+            print('\t%-30s %7.1f ms' % (name, milliseconds))
+
+    if options.output is not None:
+        with open(options.output, 'w') as f:
+            json.dump(profiles, f, indent=2)
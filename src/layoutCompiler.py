@@ -0,0 +1,159 @@
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import numpy as np
+
+LAYOUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'layouts')
+COMPILED_DIR = os.path.join(LAYOUT_DIR, 'compiled')
+
+# Same order as Actions.getLegalNeighbors: North, South, East, West, Stop
+NEIGHBOR_VECTORS = [(0, 1), (0, -1), (1, 0), (-1, 0), (0, 0)]
+
+class CompiledLayout:
+    """
+      Read-only arrays derived from a layout, memory mapped from disk so
+      every process playing the layout shares one copy in the page cache.
+
+      walls     - uint8 (width, height), 1 on walls
+      cellIds   - int32 (width, height), id of each open square, -1 on walls
+      positions - int32 (cells, 2), (x, y) of each cell id
+      neighbors - int32 (cells, 5), ids reachable in one move, padded with -1
+      distances - int16 (cells, cells), maze distance, -1 when unreachable
+    """
+    ARRAYS = ['walls', 'cellIds', 'positions', 'neighbors', 'distances']
+
+    def __init__(self, path):
+        self.path = path
+        for name in self.ARRAYS:
+            setattr(self, name, np.load(os.path.join(path, name + '.npy'), mmap_mode='r'))
+        self.width, self.height = self.walls.shape
+
+def readLayoutText(path):
+    """
+      Reads a .lay file the same way layout.tryToLoad does
+    """
+    with open(path) as f:
+        return [line.strip() for line in f]
+
+def layoutHash(layoutText):
+    return hashlib.sha1('\n'.join(layoutText).encode('utf-8')).hexdigest()
+
+_layoutKeys = {}
+
+def layoutKey(layoutText):
+    """
+      layoutHash memoized on the layout's lines.  Every GameState.deepCopy
+      copies the layout, so layouts cannot be told apart by identity, but
+      the copies share their line strings and this is one dictionary
+      lookup per call.
+    """
+    lines = tuple(layoutText)
+    key = _layoutKeys.get(lines)
+    if key is None:
+        key = _layoutKeys[lines] = layoutHash(layoutText)
+    return key
+
+def compileLayoutText(layoutText):
+    """
+      Builds the CompiledLayout arrays for a layout, flipping rows so that
+      y = 0 is the bottom line of the text like layout.Layout does
+    """
+    height = len(layoutText)
+    width = len(layoutText[0])
+    walls = np.zeros((width, height), dtype=np.uint8)
+    for row, line in enumerate(layoutText):
+        for x, layoutChar in enumerate(line[:width]):
+            if layoutChar == '%':
+                walls[x, height - 1 - row] = 1
+
+    positions = np.argwhere(walls == 0).astype(np.int32)
+    cellIds = np.full((width, height), -1, dtype=np.int32)
+    cellIds[positions[:, 0], positions[:, 1]] = np.arange(len(positions), dtype=np.int32)
+
+    neighbors = np.full((len(positions), len(NEIGHBOR_VECTORS)), -1, dtype=np.int32)
+    neighborLists = []
+    for cellId, (x, y) in enumerate(positions.tolist()):
+        cellNeighbors = []
+        for dx, dy in NEIGHBOR_VECTORS:
+            next_x, next_y = x + dx, y + dy
+            if 0 <= next_x < width and 0 <= next_y < height and not walls[next_x, next_y]:
+                cellNeighbors.append(int(cellIds[next_x, next_y]))
+        neighbors[cellId, :len(cellNeighbors)] = cellNeighbors
+        neighborLists.append(cellNeighbors)
+
+    # Breadth first search from every cell
+    distances = np.full((len(positions), len(positions)), -1, dtype=np.int16)
+    for source in range(len(positions)):
+        sourceDistances = distances[source]
+        sourceDistances[source] = 0
+        fringe = [source]
+        dist = 0
+        while fringe:
+            dist += 1
+            nextFringe = []
+            for cellId in fringe:
+                for neighbor in neighborLists[cellId]:
+                    if sourceDistances[neighbor] < 0:
+                        sourceDistances[neighbor] = dist
+                        nextFringe.append(neighbor)
+            fringe = nextFringe
+
+    return {'walls': walls, 'cellIds': cellIds, 'positions': positions,
+        'neighbors': neighbors, 'distances': distances}
+
+_compiledLayouts = {}
+
+def loadCompiledLayout(layoutText, compiledDir=COMPILED_DIR):
+    """
+      Returns the CompiledLayout for a layout, compiling and writing it the
+      first time this layout text is seen.  The artifact is written to a
+      temporary directory and renamed into place, so concurrent workers
+      either see a complete artifact or none at all.  Each process opens
+      the artifact of a layout once and keeps it.
+    """
+    key = layoutKey(layoutText)
+    compiled = _compiledLayouts.get((compiledDir, key))
+    if compiled is not None:
+        return compiled
+
+    path = os.path.join(compiledDir, key)
+    if not os.path.isdir(path):
+        os.makedirs(compiledDir, exist_ok=True)
+        tempPath = tempfile.mkdtemp(dir=compiledDir)
+        for name, array in compileLayoutText(layoutText).items():
+            np.save(os.path.join(tempPath, name + '.npy'), array)
+        try:
+            os.rename(tempPath, path)
+        except OSError:
+            # Another process finished compiling first
+            shutil.rmtree(tempPath, ignore_errors=True)
+    compiled = _compiledLayouts[(compiledDir, key)] = CompiledLayout(path)
+    return compiled
+
+def compileLayoutFile(path, compiledDir=COMPILED_DIR):
+    return loadCompiledLayout(readLayoutText(path), compiledDir)
+
+_layoutNames = None
+
+def layoutName(layoutText):
+    """
+      Name of the .lay file in LAYOUT_DIR with this text, a GameState only
+      carries the text of its layout.  Unknown layouts are named by the
+      start of their hash.
+    """
+    global _layoutNames
+    if _layoutNames is None:
+        _layoutNames = {}
+        for f in sorted(os.listdir(LAYOUT_DIR)):
+            if f.endswith('.lay'):
+                _layoutNames[layoutHash(readLayoutText(os.path.join(LAYOUT_DIR, f)))] = f.replace('.lay', '')
+    textHash = layoutHash(layoutText)
+    return _layoutNames.get(textHash, textHash[:8])
+
+if __name__ == '__main__':
+    names = sys.argv[1:] or sorted(f.replace('.lay', '') for f in os.listdir(LAYOUT_DIR) if f.endswith('.lay'))
+    for name in names:
+        compiled = compileLayoutFile(os.path.join(LAYOUT_DIR, name + '.lay'))
+        print('%s: %d cells -> %s' % (name, len(compiled.positions), compiled.path))
@@ -0,0 +1,127 @@
+import itertools
+import numpy as np
+from game import Directions, Actions
+from featureExtractors import closestFood
+from layoutCompiler import layoutKey, loadCompiledLayout
+
+class LayoutGraph:
+    """
+      Adjacency and maze distances of the open squares of a layout, read
+      from its memory-mapped CompiledLayout.
+
+      Every open square has an integer cell id.  neighbors[id] holds the ids
+      reachable in one move (staying put included) in the same order as
+      Actions.getLegalNeighbors, successors[id] maps each legal action to
+      the square it leads to and distances[id] is the row of maze
+      distances from that square.  unreachableDistance is longer than any
+      path in the maze, the bounded stand-in for food that cannot be
+      reached.
+    """
+    DIRECTIONS = [Directions.NORTH, Directions.SOUTH, Directions.EAST, Directions.WEST, Directions.STOP]
+
+    def __init__(self, layout):
+        self.walls = layout.walls
+        self.width = self.walls.width
+        self.height = self.walls.height
+
+        compiled = loadCompiledLayout(layout.layoutText)
+        self.distances = compiled.distances
+        self.flatIndices = np.asarray(compiled.positions[:, 0] * self.height + compiled.positions[:, 1])
+
+        self.positions = [tuple(position) for position in compiled.positions.tolist()]
+        self.cellIds = dict(zip(self.positions, range(len(self.positions))))
+        self.neighbors = [tuple(n for n in row if n >= 0) for row in compiled.neighbors.tolist()]
+        self.neighborPositions = [frozenset(self.positions[n] for n in neighborIds) for neighborIds in self.neighbors]
+        self.unreachableDistance = len(self.positions)
+
+        self.successors = []
+        for x, y in self.positions:
+            successors = {}
+            for action in self.DIRECTIONS:
+                dx, dy = Actions.directionToVector(action)
+                nextPosition = (int(x + dx), int(y + dy))
+                if nextPosition in self.cellIds:
+                    successors[action] = nextPosition
+            self.successors.append(successors)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def getCellId(self, position):
+        """
+          Id of the square an agent at position counts as standing on,
+          rounded the same way Actions.getLegalNeighbors does
+        """
+        x, y = position
+        return self.cellIds.get((int(x + 0.5), int(y + 0.5)))
+
+    def getLegalNeighbors(self, position):
+        """
+          Set of squares reachable in one move from position
+        """
+        cellId = self.getCellId(position)
+        if cellId is None:
+            return frozenset(Actions.getLegalNeighbors(position, self.walls))
+        return self.neighborPositions[cellId]
+
+    def getSuccessor(self, position, action):
+        """
+          Square pacman ends up on after taking a legal action from position
+        """
+        return self.successors[self.cellIds[position]][action]
+
+    def closestFoodDistance(self, position, food):
+        """
+          Same result as featureExtractors.closestFood, read off the
+          distance matrix instead of searching the maze
+        """
+        cellId = self.cellIds.get(position)
+        if cellId is None:
+            return closestFood(position, food, self.walls)
+
+        foodCells = np.fromiter(itertools.chain.from_iterable(food.data), dtype=bool, count=self.width * self.height)
+        foodDistances = self.distances[cellId][foodCells[self.flatIndices]]
+        foodDistances = foodDistances[foodDistances >= 0]
+        return int(foodDistances.min()) if len(foodDistances) > 0 else None
+
+    def closestFoodSquare(self, position, food):
+        """
+          closestFoodDistance together with the square of that food, which
+          is None when no food can be reached or position is off the graph
+        """
+        cellId = self.cellIds.get(position)
+        if cellId is None:
+            return closestFood(position, food, self.walls), None
+
+        foodCells = np.fromiter(itertools.chain.from_iterable(food.data), dtype=bool, count=self.width * self.height)
+        foodIds = np.flatnonzero(foodCells[self.flatIndices])
+        foodDistances = self.distances[cellId][foodIds]
+        reachable = foodDistances >= 0
+        if not reachable.any():
+            return None, None
+        closest = np.flatnonzero(reachable)[foodDistances[reachable].argmin()]
+        return int(foodDistances[closest]), self.positions[foodIds[closest]]
+
+    def mazeDistance(self, position, target):
+        """
+          Maze distance between two open squares, None when either is off
+          the graph or target cannot be reached
+        """
+        cellId, targetId = self.cellIds.get(position), self.cellIds.get(target)
+        if cellId is None or targetId is None or self.distances[cellId][targetId] < 0:
+            return None
+        return int(self.distances[cellId][targetId])
+
+_layoutGraphs = {}
+
+def getLayoutGraph(layout):
+    """
+      Returns the LayoutGraph of a layout, building it the first time the
+      layout's text is seen.  Agents get a deep copy of the layout with
+      every state, so graphs are keyed by content, one per distinct layout.
+    """
+    key = layoutKey(layout.layoutText)
+    entry = _layoutGraphs.get(key)
+    if entry is None:
+        entry = _layoutGraphs[key] = LayoutGraph(layout)
+    return entry
@@ -0,0 +1,127 @@
+import time
+
+class MoveBudget:
+    """
+      Per-move time budget of an agent's decisions.
+
+      instrument() wraps the agent's getAction, which opens a move with a
+      deadline budgetMs after it starts, and its extractFeatureVector, whose
+      running mean cost tells whether one more exact extraction still fits
+      before the deadline.  When it does not, the agent approximates the
+      features of the actions left (approximate), taking the closest-food
+      distance from the food square the last exact extraction found.
+      A move without an exact extraction halves the expected cost, so one
+      slow extraction (the first of a layout builds its LayoutGraph) does
+      not keep every later move approximating.  Outside getAction there is
+      no deadline.  The vectors a move approximated are kept until the next
+      move (approximation), so learning from that decision uses the
+      features it was taken with, and every other state gets exact ones.
+    """
+    def __init__(self, budgetMs):
+        self.budgetMs = float(budgetMs)
+        self.budgetNs = int(self.budgetMs * 1e6)
+        self.deadline = None
+        self.extractionNs = 0.0
+        self.approximated = {}
+        self.moveState = None
+        self.extracted = False
+        self.foodSquare = None
+        self.foodDistance = None
+        self.moves = 0
+        self.lateMoves = 0
+        self.approximations = 0
+
+    def instrument(self, agent):
+        getAction = agent.getAction
+        def boundedGetAction(state):
+            self.startMove(state)
+            try:
+                return getAction(state)
+            finally:
+                self.endMove()
+        agent.getAction = boundedGetAction
+
+        extractFeatureVector = agent.extractFeatureVector
+        def timedExtractFeatureVector(state, action):
+            start = time.perf_counter_ns()
+            try:
+                return extractFeatureVector(state, action)
+            finally:
+                self.recordExtraction(time.perf_counter_ns() - start)
+        agent.extractFeatureVector = timedExtractFeatureVector
+
+    def startEpisode(self):
+        self.foodSquare = None
+        self.foodDistance = None
+
+    def startMove(self, state):
+        self.deadline = time.perf_counter_ns() + self.budgetNs
+        self.approximated.clear()
+        self.moveState = state
+        self.extracted = False
+        self.moves += 1
+
+    def endMove(self):
+        if self.approximated:
+            self.lateMoves += 1
+            if not self.extracted:
+                self.extractionNs *= 0.5
+        self.deadline = None
+
+    def recordExtraction(self, elapsedNs):
+        self.extracted = True
+        if self.extractionNs == 0.0:
+            self.extractionNs = float(elapsedNs)
+        else:
+            self.extractionNs += 0.1 * (elapsedNs - self.extractionNs)
+
+    def canExtract(self):
+        """
+          Whether an exact extraction is expected to finish before the
+          deadline of the current move, always outside a move
+        """
+        return self.deadline is None or time.perf_counter_ns() + self.extractionNs <= self.deadline
+
+    def approximate(self, action, approximateFn):
+        """
+          The approximated features of an action, computed once per move so
+          every softmax of the move sees the same vector
+        """
+        if action not in self.approximated:
+            self.approximated[action] = approximateFn()
+            self.approximations += 1
+        return self.approximated[action]
+
+    def approximation(self, state, action):
+        """
+          The vector the last move approximated for action when state is
+          that move's state, otherwise None
+        """
+        if state is self.moveState:
+            return self.approximated.get(action)
+        return None
+
+    def rememberFood(self, square, distance):
+        self.foodSquare = square
+        self.foodDistance = distance
+
+    def approximateFoodDistance(self, state, layoutGraph, position):
+        """
+          Maze distance from position to the food the last exact extraction
+          found closest, an upper bound that is exact while that food is
+          still the closest.  Once it is eaten the last exact distance is
+          reused as it is.
+        """
+        if self.foodSquare is not None:
+            x, y = self.foodSquare
+            if state.hasFood(x, y) or self.foodSquare in state.getCapsules():
+                distance = layoutGraph.mazeDistance(position, self.foodSquare)
+                if distance is not None:
+                    return distance
+        if self.foodDistance is not None:
+            return self.foodDistance
+        return layoutGraph.unreachableDistance
+
+    def summary(self):
+        return 'Move budget of %g ms: %d of %d moves fell back (%.2f%%), %d feature vectors approximated' % (
+            self.budgetMs, self.lateMoves, self.moves, 100.0 * self.lateMoves / max(self.moves, 1), self.approximations)
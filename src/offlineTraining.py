@@ -0,0 +1,252 @@
+import optparse
+import sys
+import time
+import numpy as np
+import pacman
+from parameterStore import saveCheckpoint
+from policyMath import batchActionLogProbabilities
+from recordings import Recording, replayTransitions
+from trajectory import TrajectoryBuffer
+
+class PolicyBatch:
+    """
+      Every recorded pacman decision turned into arrays once: the feature
+      vectors of all legal actions, the action taken, the reward, the step
+      within its episode and the behaviour policy's probability of the
+      action.  episodeStarts holds where each episode begins.
+    """
+    def __init__(self, agent, recordings):
+        self.trajectory = TrajectoryBuffer(len(agent.theta))
+        steps = []
+        behaviourProbabilities = []
+        episodeStarts = [0]
+        for recording in recordings:
+            gameLayout = recording.getLayout()
+            for episode in range(len(recording)):
+                behaviourProbabilities.extend(recording.episode(episode)[3])
+                for t, (state, action, nextState, reward) in enumerate(replayTransitions(recording, episode, gameLayout)):
+                    legalActions = agent.getLegalActions(state)
+                    self.trajectory.append([agent.getFeatureVector(state, legalAction) for legalAction in legalActions],
+                        legalActions.index(action), reward)
+                    steps.append(t)
+                episodeStarts.append(len(self.trajectory))
+
+        length = len(self.trajectory)
+        self.features = self.trajectory.features[:length]
+        self.numActions = self.trajectory.numActions[:length]
+        self.actionIndices = self.trajectory.actionIndices[:length].astype(np.int64)
+        self.rewards = self.trajectory.rewards[:length]
+        self.steps = np.array(steps)
+        self.behaviourProbabilities = np.array(behaviourProbabilities, dtype=np.float64)
+        self.episodeStarts = np.array(episodeStarts)
+
+    def numEpisodes(self):
+        return len(self.episodeStarts) - 1
+
+def importanceWeights(targetLogProbabilities, behaviourProbabilities, episodeStarts, maxWeight):
+    """
+      Per-decision importance weights: the product of the ratios of the
+      target and behaviour probabilities of the decisions so far in the
+      episode, clipped at maxWeight.  Decisions recorded without a
+      behaviour probability count as on-policy.
+
+      episodeStarts: where each episode begins, relative to the first row
+    """
+    logRatios = targetLogProbabilities - np.log(behaviourProbabilities)
+    logRatios = np.where(np.isnan(behaviourProbabilities), 0.0, logRatios)
+    cumulative = np.cumsum(logRatios)
+
+    # Restart the running product at every episode
+    before = np.concatenate([[0.0], cumulative[episodeStarts[1:-1] - 1]])
+    cumulative -= np.repeat(before, np.diff(episodeStarts))
+    return np.exp(np.minimum(cumulative, np.log(maxWeight)))
+
+def batchReinforce(agent, batch, numPasses=10, batchSize=32, maxWeight=10.0):
+    """
+      Off-policy REINFORCE over recorded episodes.  The gradient is the
+      same as ReinforceAgent.update, alpha * gamma^t * r_t * grad log pi,
+      weighted by importanceWeights and averaged over batchSize episodes
+      per step of theta.
+    """
+    theta = np.array(agent.theta, dtype=np.float64)
+    for _ in range(numPasses):
+        for first in range(0, batch.numEpisodes(), batchSize):
+            last = min(first + batchSize, batch.numEpisodes())
+            rows = slice(batch.episodeStarts[first], batch.episodeStarts[last])
+            features = batch.features[rows]
+            actionIndices = batch.actionIndices[rows]
+            rowIndices = np.arange(len(actionIndices))
+
+            logProbabilities = batchActionLogProbabilities(features, batch.numActions[rows], theta)
+            probabilities = np.exp(logProbabilities)
+            # x(s,a) - Sum pi(s,*)x(s,*)
+            gradients = features[rowIndices, actionIndices] - np.einsum('ra,raf->rf', probabilities, features)
+
+            weights = importanceWeights(logProbabilities[rowIndices, actionIndices], batch.behaviourProbabilities[rows],
+                batch.episodeStarts[first:last + 1] - batch.episodeStarts[first], maxWeight)
+            scales = weights * np.power(agent.gamma, batch.steps[rows]) * batch.rewards[rows]
+            theta += agent.alpha * scales.dot(gradients) / (last - first)
+
+    agent.theta[:] = theta.tolist()
+    return theta
+
+# Larger feature values are sentinels, e.g. SimpleExtractor's closest-food when no food can be reached
+MAX_FEATURE_VALUE = 1e6
+
+def boundFeatures(features, nextFeatures):
+    """
+      Replaces non-finite and sentinel feature values, in place, by the
+      largest regular value of the same feature in the batch, a bounded
+      stand-in like the agents' unreachable food distance.  Left alone they
+      dominate the regression and its weights run off to infinity.
+      Returns the number of values replaced.
+    """
+    replaced = 0
+    for column in range(features.shape[1]):
+        values = np.concatenate([features[:, column], nextFeatures[:, :, column].ravel()])
+        regular = values[np.isfinite(values) & (np.abs(values) <= MAX_FEATURE_VALUE)]
+        standIn = regular.max() if len(regular) > 0 else 0.0
+        for array in (features[:, column], nextFeatures[:, :, column]):
+            sentinels = ~np.isfinite(array) | (np.abs(array) > MAX_FEATURE_VALUE)
+            array[sentinels] = standIn
+            replaced += int(sentinels.sum())
+    return replaced
+
+class QBatch:
+    """
+      Every recorded pacman transition turned into arrays once: the
+      features of the action taken, the features of every legal action in
+      the next state (none when it is terminal) and the reward.  Features
+      are ordered by the keys list, in the order they were first seen.
+      Sentinel feature values are bounded, see boundFeatures.
+    """
+    def __init__(self, agent, recordings):
+        takenFeatures = []
+        nextFeatures = []
+        rewards = []
+        self.keys = []
+        for recording in recordings:
+            gameLayout = recording.getLayout()
+            for episode in range(len(recording)):
+                for state, action, nextState, reward in replayTransitions(recording, episode, gameLayout):
+                    takenFeatures.append(agent.getFeatures(state, action))
+                    nextFeatures.append([agent.getFeatures(nextState, nextAction)
+                        for nextAction in agent.getLegalActions(nextState)])
+                    rewards.append(reward)
+                    for features in [takenFeatures[-1]] + nextFeatures[-1]:
+                        for key in features:
+                            if key not in self.keys:
+                                self.keys.append(key)
+
+        slots = dict((key, slot) for slot, key in enumerate(self.keys))
+        maxActions = max([len(actions) for actions in nextFeatures] + [1])
+        self.features = np.zeros((len(rewards), len(self.keys)))
+        self.nextFeatures = np.zeros((len(rewards), maxActions, len(self.keys)))
+        self.nextNumActions = np.array([len(actions) for actions in nextFeatures])
+        self.rewards = np.array(rewards, dtype=np.float64)
+        for row in range(len(rewards)):
+            for key, value in takenFeatures[row].items():
+                self.features[row, slots[key]] = value
+            for column, features in enumerate(nextFeatures[row]):
+                for key, value in features.items():
+                    self.nextFeatures[row, column, slots[key]] = value
+
+        self.boundedValues = boundFeatures(self.features, self.nextFeatures)
+        if self.boundedValues > 0:
+            print('Bounded %d sentinel feature values' % self.boundedValues)
+
+def fittedQIteration(agent, batch, numPasses=10, ridge=1e-3):
+    """
+      Fitted Q iteration for the linear Q function of ApproximateQAgent.
+      Every pass computes the targets r + discount * max_a' Q(s', a') with
+      the current weights and refits all weights to them at once by ridge
+      regression.  Raises when the weights stop being finite.
+    """
+    weights = np.array([agent.weights[key] for key in batch.keys], dtype=np.float64)
+    legal = np.arange(batch.nextFeatures.shape[1])[np.newaxis, :] < batch.nextNumActions[:, np.newaxis]
+    gram = batch.features.T.dot(batch.features) + ridge * np.eye(len(batch.keys))
+    for passIndex in range(numPasses):
+        nextValues = np.where(legal, batch.nextFeatures.dot(weights), -np.inf).max(axis=1)
+        # Terminal states are worth nothing, like computeValueFromQValues without legal actions
+        nextValues = np.where(batch.nextNumActions > 0, nextValues, 0.0)
+        targets = batch.rewards + agent.discount * nextValues
+        weights = np.linalg.solve(gram, batch.features.T.dot(targets))
+        if not np.isfinite(weights).all():
+            raise Exception('Fitted Q iteration diverged in pass %d, the weights are no longer finite: %s' % (
+                passIndex + 1, dict(zip(batch.keys, weights.tolist()))))
+
+    for key, weight in zip(batch.keys, weights):
+        agent.weights[key] = float(weight)
+    return weights
+
+def trainOffline(agent, recordings, numPasses=10, batchSize=32, maxWeight=10.0, ridge=1e-3):
+    """
+      Extracts the features of the recorded episodes once and fits the
+      agent's parameters to them, returns the number of decisions used
+    """
+    if hasattr(agent, 'trajectory'):
+        batch = PolicyBatch(agent, recordings)
+        if np.isnan(batch.behaviourProbabilities).any():
+            print('Some episodes were recorded without behaviour probabilities, they are treated as on-policy')
+        batchReinforce(agent, batch, numPasses, batchSize, maxWeight)
+        return len(batch.rewards)
+    if hasattr(agent, 'featExtractor'):
+        batch = QBatch(agent, recordings)
+        fittedQIteration(agent, batch, numPasses, ridge)
+        return len(batch.rewards)
+    raise Exception('Offline training supports ReinforceAgent and ApproximateQAgent, not ' + type(agent).__name__)
+
+def readCommand(argv):
+    """
+      Processes the command used to train from recordings from the command line.
+    """
+    usageStr = """
+    USAGE:      python offlineTraining.py <options>
+    EXAMPLES:   (1) python offlineTraining.py -p ReinforceAgent -r games.npz -e 20 -a alpha=0.2,gamma=0.8 -o reinforce.json
+                    - fits theta to recorded games and saves it
+                (2) python pacman.py -p ReinforceAgent -a paramFile=reinforce.json
+                    - plays with the saved theta
+    """
+    parser = optparse.OptionParser(usageStr)
+    parser.add_option('-p', '--pacman', dest='pacman', default='ReinforceAgent',
+                      help='the agent TYPE in the pacmanAgents module to train', metavar='TYPE')
+    parser.add_option('-a', '--agentArgs', dest='agentArgs',
+                      help='Comma separated values sent to agent. e.g. "opt1=val1,opt2,opt3=val3"')
+    parser.add_option('-r', '--recordings', dest='recordings',
+                      help='comma separated .npz files written by recordings.py')
+    parser.add_option('-e', '--passes', dest='numPasses', type='int', default=10,
+                      help='the number of passes over the recorded data')
+    parser.add_option('-b', '--batchSize', dest='batchSize', type='int', default=32,
+                      help='the number of episodes per REINFORCE step')
+    parser.add_option('-m', '--maxWeight', dest='maxWeight', type='float', default=10.0,
+                      help='the largest importance weight of a REINFORCE step')
+    parser.add_option('--ridge', dest='ridge', type='float', default=1e-3,
+                      help='the ridge penalty of the fitted Q regression')
+    parser.add_option('-o', '--output', dest='output', default=None,
+                      help='save the trained parameters to this file')
+
+    options, otherjunk = parser.parse_args(argv)
+    if len(otherjunk) != 0:
+        raise Exception('Command line input not understood: ' + str(otherjunk))
+    if options.recordings is None:
+        raise Exception('Give the recordings to train on with -r')
+
+    agent = pacman.loadAgent(options.pacman, True)(**pacman.parseAgentArgs(options.agentArgs))
+    recordings = [Recording.load(path) for path in options.recordings.split(',')]
+    return options, agent, recordings
+
+if __name__ == '__main__':
+    options, agent, recordings = readCommand(sys.argv[1:])
+
+    startTime = time.time()
+    numDecisions = trainOffline(agent, recordings, options.numPasses, options.batchSize, options.maxWeight, options.ridge)
+    print('Trained on %d decisions from %d episodes in %.2f seconds' % (
+        numDecisions, sum(len(recording) for recording in recordings), time.time() - startTime))
+
+    if hasattr(agent, 'trajectory'):
+        print('Theta:', list(agent.theta))
+    else:
+        for key, weight in agent.weights.items():
+            print(f"{key} : {weight}")
+    if options.output is not None:
+        saveCheckpoint(options.output, agent)
@@ -0,0 +1,259 @@
+import json
+import numpy as np
+try:
+    from multiprocessing import resource_tracker, shared_memory
+except ImportError:
+    # multiprocessing.shared_memory needs Python 3.8
+    shared_memory = None
+
+HEADER_SIZE = 4096
+
+# Features SimpleExtractor produces, the weights ApproximateQAgent learns
+SIMPLE_EXTRACTOR_FEATURES = ['bias', '#-of-ghosts-1-step-away', 'eats-food', 'closest-food']
+
+# Parameters each agent keeps, as a length or a list of weight names
+AGENT_PARAMETERS = {
+    'ReinforceAgent': {'theta': 4},
+    'ActorCriticAgent': {'theta': 4, 'w': 4},
+    'ApproximateQAgent': {'weights': SIMPLE_EXTRACTOR_FEATURES},
+}
+
+class SharedWeights:
+    """
+      util.Counter-like view of a shared array whose slots are named by a
+      fixed list of keys, so ApproximateQAgent can keep using
+      self.weights[feature]
+    """
+    def __init__(self, values, keys):
+        self.values = values
+        self.slots = dict(zip(keys, range(len(keys))))
+
+    def slot(self, key):
+        if key not in self.slots:
+            raise Exception('The shared weights have no slot for feature ' + str(key))
+        return self.slots[key]
+
+    def __getitem__(self, key):
+        return float(self.values[self.slot(key)])
+
+    def __setitem__(self, key, value):
+        self.values[self.slot(key)] = value
+
+    def __contains__(self, key):
+        return key in self.slots
+
+    def __iter__(self):
+        return iter(self.slots)
+
+    def __len__(self):
+        return len(self.slots)
+
+    def keys(self):
+        return self.slots.keys()
+
+    def items(self):
+        return [(key, float(self.values[slot])) for key, slot in self.slots.items()]
+
+class ParameterStore:
+    """
+      Named float64 parameter arrays living in one shared memory block, so
+      agents in different processes read and write the same numbers without
+      pickling them back and forth.
+
+      The block starts with a JSON header describing the arrays, followed by
+      one int64 version counter per array and then the arrays themselves.
+      Any process can attach by name.  Writes go through a
+      multiprocessing.Lock when one is given, otherwise updates are applied
+      lock free, Hogwild style: concurrent element updates may interleave
+      and version counters are best effort.
+    """
+    def __init__(self, block, owner, lock=None):
+        self.block = block
+        self.owner = owner
+        self.lock = lock
+        self.name = block.name
+
+        headerLength = int(np.frombuffer(block.buf, dtype=np.int64, count=1)[0])
+        self.header = json.loads(bytes(block.buf[8:8 + headerLength]).decode('utf-8'))
+
+        self.versions = np.frombuffer(block.buf, dtype=np.int64, count=len(self.header['arrays']), offset=HEADER_SIZE)
+        self.arrays = {}
+        self.keys = {}
+        for index, entry in enumerate(self.header['arrays']):
+            self.arrays[entry['name']] = np.frombuffer(block.buf, dtype=np.float64, count=entry['length'], offset=entry['offset'])
+            self.keys[entry['name']] = entry['keys']
+        self.versionIndex = dict((entry['name'], index) for index, entry in enumerate(self.header['arrays']))
+
+    @classmethod
+    def create(cls, parameters, name=None, lock=None):
+        """
+          parameters: dict from array name to its initial values, its length
+                      or a list of weight names (starting at 0)
+        """
+        if shared_memory is None:
+            raise Exception('Shared parameter stores need Python 3.8 or newer')
+
+        entries = []
+        offset = HEADER_SIZE + 8 * len(parameters)
+        for arrayName, spec in parameters.items():
+            keys = None
+            if isinstance(spec, int):
+                length = spec
+            elif all(isinstance(key, str) for key in spec):
+                keys = list(spec)
+                length = len(keys)
+            else:
+                length = len(spec)
+            entries.append({'name': arrayName, 'offset': offset, 'length': length, 'keys': keys})
+            offset += 8 * length
+
+        header = json.dumps({'arrays': entries}).encode('utf-8')
+        if len(header) > HEADER_SIZE - 8:
+            raise Exception('Too many parameter arrays for one store')
+
+        block = shared_memory.SharedMemory(name=name, create=True, size=offset)
+        block.buf[:offset] = bytes(offset)
+        np.frombuffer(block.buf, dtype=np.int64, count=1)[0] = len(header)
+        block.buf[8:8 + len(header)] = header
+
+        store = cls(block, True, lock)
+        for arrayName, spec in parameters.items():
+            if not isinstance(spec, int) and store.keys[arrayName] is None:
+                store.arrays[arrayName][:] = spec
+        return store
+
+    @classmethod
+    def attach(cls, name, lock=None):
+        if shared_memory is None:
+            raise Exception('Shared parameter stores need Python 3.8 or newer')
+        return cls(_attachBlock(name), False, lock)
+
+    def array(self, arrayName):
+        """
+          Zero-copy view of a parameter array, writes land in shared memory
+        """
+        return self.arrays[arrayName]
+
+    def weights(self, arrayName):
+        return SharedWeights(self.arrays[arrayName], self.keys[arrayName])
+
+    def version(self, arrayName):
+        return int(self.versions[self.versionIndex[arrayName]])
+
+    def bumpVersion(self, arrayName):
+        self.versions[self.versionIndex[arrayName]] += 1
+
+    def read(self, arrayName):
+        """
+          Returns a private copy of an array together with its version
+        """
+        if self.lock is None:
+            return self.arrays[arrayName].copy(), self.version(arrayName)
+        with self.lock:
+            return self.arrays[arrayName].copy(), self.version(arrayName)
+
+    def write(self, arrayName, values):
+        if self.lock is None:
+            self._write(arrayName, values)
+            return
+        with self.lock:
+            self._write(arrayName, values)
+
+    def _write(self, arrayName, values):
+        self.arrays[arrayName][:] = values
+        self.bumpVersion(arrayName)
+
+    def add(self, arrayName, delta, lockFree=False):
+        """
+          Adds delta to an array in place, skipping the lock when lockFree
+        """
+        if self.lock is None or lockFree:
+            self._add(arrayName, delta)
+            return
+        with self.lock:
+            self._add(arrayName, delta)
+
+    def _add(self, arrayName, delta):
+        self.arrays[arrayName] += delta
+        self.bumpVersion(arrayName)
+
+    def close(self):
+        """
+          Detaches from the block, the creating process also frees it
+        """
+        self.arrays = {}
+        self.versions = None
+        try:
+            self.block.close()
+        except BufferError:
+            # An agent still holds a view of the parameters, the mapping goes away with the process
+            pass
+        if self.owner:
+            self.block.unlink()
+
+def createAgentStore(agentName, name=None, lock=None):
+    """
+      Creates a store with the parameters of one of the agents, which the
+      agent uses when given parameterStore=<store name>
+    """
+    return ParameterStore.create(AGENT_PARAMETERS[agentName], name, lock)
+
+def _attachBlock(name):
+    """
+      Attaches without letting this process's resource tracker unlink the
+      block when it exits, only the creator frees it
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        register = resource_tracker.register
+        resource_tracker.register = lambda *args: None
+        try:
+            return shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+
+def agentParameters(agent):
+    """
+      The parameters an agent keeps (see AGENT_PARAMETERS) as plain lists
+      and dicts
+    """
+    parameters = {}
+    for arrayName, spec in AGENT_PARAMETERS[type(agent).__name__].items():
+        values = getattr(agent, arrayName)
+        if isinstance(spec, int):
+            parameters[arrayName] = [float(value) for value in values]
+        else:
+            parameters[arrayName] = dict((key, float(value)) for key, value in values.items())
+    return parameters
+
+def setAgentParameters(agent, parameters):
+    """
+      Copies parameters from agentParameters into an agent, in place so
+      shared parameter views keep working
+    """
+    for arrayName, values in parameters.items():
+        target = getattr(agent, arrayName)
+        if isinstance(values, dict):
+            for key, value in values.items():
+                target[key] = value
+        else:
+            target[:] = values
+
+def saveCheckpoint(path, agent):
+    """
+      Writes the parameters of an agent to a JSON file that the agents
+      load with paramFile=<path>
+    """
+    with open(path, 'w') as f:
+        json.dump({'agent': type(agent).__name__, 'parameters': agentParameters(agent)}, f, indent=2)
+
+def loadCheckpoint(path, agent):
+    """
+      Copies the parameters saved by saveCheckpoint into an agent
+    """
+    with open(path) as f:
+        checkpoint = json.load(f)
+    if checkpoint['agent'] != type(agent).__name__:
+        raise Exception('%s holds parameters of a %s, not a %s' % (path, checkpoint['agent'], type(agent).__name__))
+    setAgentParameters(agent, checkpoint['parameters'])
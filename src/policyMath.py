@@ -0,0 +1,59 @@
+import math
+import numpy as np
+
+def actionLogProbabilities(actionFeatures, theta):
+    """
+      Log of the softmax policy over one state's actions, computed as
+      h - logsumexp(h) around the largest preference so no exponent is
+      above 0: nothing overflows and no probability is lost to underflow
+      before it has to be.
+    """
+    preferences = [sum(weight * feature for weight, feature in zip(theta, featureVector)) for featureVector in actionFeatures]
+    maxPreference = max(preferences)
+    logNormalizer = maxPreference + math.log(sum(math.exp(h - maxPreference) for h in preferences))
+    return [h - logNormalizer for h in preferences]
+
+def softmaxProbabilities(actionFeatures, theta):
+    """
+      Softmax policy over one state's actions, one feature vector per
+      legal action
+    """
+    return [math.exp(logProbability) for logProbability in actionLogProbabilities(actionFeatures, theta)]
+
+def batchActionLogProbabilities(actionFeatures, numActions, theta):
+    """
+      Log-softmax policy for many states at once.
+
+      actionFeatures: (states, maxActions, features) array, rows at or past
+                      numActions[s] are padding
+      numActions: number of legal actions of each state
+      theta: policy weights
+
+      Returns a (states, maxActions) array of log probabilities that is
+      -inf on the padding.
+    """
+    preferences = np.asarray(actionFeatures, dtype=float).dot(np.asarray(theta, dtype=float))
+    preferences = np.nan_to_num(preferences, nan=0.0, posinf=1e300, neginf=-1e300)
+
+    legal = np.arange(preferences.shape[1])[np.newaxis, :] < np.asarray(numActions)[:, np.newaxis]
+    preferences = np.where(legal, preferences, -np.inf)
+    preferences -= preferences.max(axis=1, keepdims=True)
+    return preferences - np.log(np.exp(preferences).sum(axis=1, keepdims=True))
+
+def batchActionProbabilities(actionFeatures, numActions, theta):
+    """
+      Softmax policy for many states at once, see
+      batchActionLogProbabilities.  Returns a (states, maxActions) array of
+      probabilities that is 0 on the padding.
+    """
+    return np.exp(batchActionLogProbabilities(actionFeatures, numActions, theta))
+
+def sampleActions(probabilities, numActions, randomNums):
+    """
+      Index of the sampled action of each state: the first action whose
+      cumulative probability reaches the state's uniform draw, the same
+      rule the agents' getAction uses
+    """
+    cumulative = np.cumsum(probabilities, axis=1)
+    actionIndices = (cumulative < np.asarray(randomNums)[:, np.newaxis]).sum(axis=1)
+    return np.minimum(actionIndices, np.asarray(numActions) - 1)
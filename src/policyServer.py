@@ -0,0 +1,222 @@
+import asyncio
+import json
+import optparse
+import os
+import socket
+import sys
+import time
+import numpy as np
+from policyMath import batchActionProbabilities
+
+# Agents whose checkpoints hold a softmax policy over linear preferences
+POLICY_AGENTS = ['ReinforceAgent', 'ActorCriticAgent']
+
+def loadPolicy(path):
+    """
+      The policy weights theta of a checkpoint written by
+      parameterStore.saveCheckpoint
+    """
+    with open(path) as f:
+        checkpoint = json.load(f)
+    if checkpoint['agent'] not in POLICY_AGENTS:
+        raise Exception('%s holds parameters of a %s, only %s policies can be served' % (
+            path, checkpoint['agent'], ' and '.join(POLICY_AGENTS)))
+    return np.array(checkpoint['parameters']['theta'], dtype=np.float64)
+
+class MicroBatcher:
+    """
+      Coalesces the requests of concurrent clients into batches for one
+      vectorized softmax.  A batch is closed when it holds maxBatchSize
+      requests or maxWait seconds after its first request arrived,
+      whichever comes first, so a lone request waits at most maxWait.
+    """
+    def __init__(self, theta, maxBatchSize=64, maxWait=0.002):
+        self.theta = theta
+        self.maxBatchSize = maxBatchSize
+        self.maxWait = maxWait
+        # Made by start(), before Python 3.10 a queue belongs to the loop it is created under
+        self.queue = None
+        self.numRequests = 0
+        self.numBatches = 0
+
+    def submit(self, actionFeatures):
+        """
+          Queues one state's feature vectors, one per legal action, and
+          returns a future of its action probabilities
+        """
+        actionFeatures = np.asarray(actionFeatures, dtype=np.float64)
+        if actionFeatures.ndim != 2 or len(actionFeatures) == 0 or actionFeatures.shape[1] != len(self.theta):
+            raise ValueError('features must be one vector of %d features per legal action' % len(self.theta))
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((actionFeatures, future))
+        return future
+
+    async def nextBatch(self):
+        batch = [await self.queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.maxWait
+        while len(batch) < self.maxBatchSize:
+            # Whatever is already queued joins without waiting
+            if not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+                continue
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    def evaluate(self, batch):
+        """
+          Action probabilities of every request of a batch, padded to the
+          most legal actions any of them has
+        """
+        numActions = [len(actionFeatures) for actionFeatures, future in batch]
+        padded = np.zeros((len(batch), max(numActions), len(self.theta)))
+        for row, (actionFeatures, future) in enumerate(batch):
+            padded[row, :len(actionFeatures)] = actionFeatures
+        probabilities = batchActionProbabilities(padded, numActions, self.theta)
+        return [probabilities[row, :count].tolist() for row, count in enumerate(numActions)]
+
+    def start(self):
+        """
+          Starts batching on the running event loop, returns its task
+        """
+        self.queue = asyncio.Queue()
+        return asyncio.ensure_future(self.run())
+
+    async def run(self):
+        while True:
+            batch = await self.nextBatch()
+            self.numRequests += len(batch)
+            self.numBatches += 1
+            for (actionFeatures, future), probabilities in zip(batch, self.evaluate(batch)):
+                # A client that hung up leaves a cancelled future behind
+                if not future.done():
+                    future.set_result(probabilities)
+
+    def summary(self):
+        return 'Served %d requests in %d batches (%.1f per batch)' % (
+            self.numRequests, self.numBatches, self.numRequests / float(max(self.numBatches, 1)))
+
+class PolicyServer:
+    """
+      Serves the action distributions of a trained policy over a Unix
+      socket.  The protocol is one JSON object per line both ways: a request
+      {"features": [[...], ...]} holds the feature vector of every legal
+      action of one state, as the agent's getFeatureVector computes it, and
+      is answered with {"probabilities": [...]} in the same action order,
+      or {"error": "..."}.  A client may send several requests before
+      reading, the answers come back in the order they were asked.
+    """
+    def __init__(self, theta, socketPath, maxBatchSize=64, maxWait=0.002):
+        self.socketPath = socketPath
+        self.batcher = MicroBatcher(theta, maxBatchSize, maxWait)
+
+    async def handleClient(self, reader, writer):
+        answers = asyncio.Queue()
+
+        async def writeAnswers():
+            while True:
+                answer = await answers.get()
+                if answer is None:
+                    break
+                if isinstance(answer, dict):
+                    writer.write((json.dumps(answer) + '\n').encode('utf-8'))
+                else:
+                    writer.write((json.dumps({'probabilities': await answer}) + '\n').encode('utf-8'))
+                await writer.drain()
+
+        writing = asyncio.ensure_future(writeAnswers())
+        try:
+            async for line in reader:
+                if not line.strip():
+                    continue
+                try:
+                    answers.put_nowait(self.batcher.submit(json.loads(line)['features']))
+                except (ValueError, KeyError, TypeError) as error:
+                    answers.put_nowait({'error': str(error)})
+            answers.put_nowait(None)
+            await writing
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            # The client hung up or the server is shutting down
+            writing.cancel()
+        finally:
+            writer.close()
+
+    async def serve(self):
+        if os.path.exists(self.socketPath):
+            os.remove(self.socketPath)
+        batching = self.batcher.start()
+        server = await asyncio.start_unix_server(self.handleClient, path=self.socketPath)
+        print('Serving %d policy weights on %s (batches of up to %d, waiting up to %.1f ms)' % (
+            len(self.batcher.theta), self.socketPath, self.batcher.maxBatchSize, 1000.0 * self.batcher.maxWait))
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batching.cancel()
+            if os.path.exists(self.socketPath):
+                os.remove(self.socketPath)
+
+class PolicyClient:
+    """
+      Blocking client of a PolicyServer, for bots and replay tools that do
+      not run an event loop
+    """
+    def __init__(self, socketPath):
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.connect(socketPath)
+        self.file = self.socket.makefile('rwb')
+
+    def actionProbabilities(self, actionFeatures):
+        self.file.write((json.dumps({'features': [list(map(float, featureVector)) for featureVector in actionFeatures]}) + '\n').encode('utf-8'))
+        self.file.flush()
+        answer = json.loads(self.file.readline())
+        if 'error' in answer:
+            raise Exception('The policy server refused the request: ' + answer['error'])
+        return answer['probabilities']
+
+    def close(self):
+        self.file.close()
+        self.socket.close()
+
+def readCommand(argv):
+    """
+      Processes the command used to serve a policy from the command line.
+    """
+    usageStr = """
+    USAGE:      python policyServer.py <options>
+    EXAMPLES:   (1) python policyServer.py -f reinforce.json
+                    - serves the policy of a checkpoint on /tmp/pacmanPolicy.sock
+                (2) python policyServer.py -f actorCritic.json -u policy.sock --maxBatch 256 --maxWait 5
+                    - larger batches, a request waits up to 5 ms for others to join it
+    """
+    parser = optparse.OptionParser(usageStr)
+    parser.add_option('-f', '--paramFile', dest='paramFile', default=None,
+                      help='the checkpoint of the policy, see parameterStore.saveCheckpoint')
+    parser.add_option('-u', '--socket', dest='socketPath', default='/tmp/pacmanPolicy.sock',
+                      help='the Unix socket to listen on')
+    parser.add_option('--maxBatch', dest='maxBatchSize', type='int', default=64,
+                      help='the most requests evaluated in one batch')
+    parser.add_option('--maxWait', dest='maxWait', type='float', default=2.0,
+                      help='the milliseconds a request waits for others to join its batch')
+
+    options, otherjunk = parser.parse_args(argv)
+    if len(otherjunk) != 0:
+        raise Exception('Command line input not understood: ' + str(otherjunk))
+    if options.paramFile is None:
+        raise Exception('A checkpoint to serve is needed (-f)')
+    return options
+
+if __name__ == '__main__':
+    options = readCommand(sys.argv[1:])
+    server = PolicyServer(loadPolicy(options.paramFile), options.socketPath, options.maxBatchSize, options.maxWait / 1000.0)
+    startTime = time.time()
+    try:
+        asyncio.run(server.serve())
+    except KeyboardInterrupt:
+        pass
+    print('%s over %.1f seconds' % (server.batcher.summary(), time.time() - startTime))
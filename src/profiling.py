@@ -0,0 +1,249 @@
+import atexit
+import json
+import time
+from layoutCompiler import layoutName
+
+def isEnabled(value):
+    """
+      Agent args arrive as strings from pacman.py, so profile=0 has to be
+      told apart from profile=1
+    """
+    return str(value).lower() in ('1', 'true', 'yes', 'on')
+
+_exitSummaries = []
+
+def registerExitSummary(recorder):
+    """
+      Prints the run summary of a PhaseProfiler or DecisionLatency when the
+      process exits.  The handler is registered once per process and
+      recorders of the same kind are merged first, so drivers that build
+      many agents print one summary rather than one per agent.
+    """
+    if not _exitSummaries:
+        atexit.register(printExitSummaries)
+    _exitSummaries.append(recorder)
+
+def printExitSummaries():
+    byKind = {}
+    for recorder in _exitSummaries:
+        byKind.setdefault(recorder.kind(), []).append(recorder)
+    for recorders in byKind.values():
+        merged = recorders[0]
+        if len(recorders) > 1:
+            merged = recorders[0].merged(recorders)
+        merged.printSummary()
+
+class LatencyHistogram:
+    """
+      Log-bucketed histogram of nanosecond timings in the spirit of
+      HdrHistogram.  Values below 2^subBucketBits get a bucket each, and
+      every power of two above that is split into 2^subBucketBits linear
+      buckets, so a percentile is exact to within 1/16 of its value with
+      the default of 4 bits while recording stays a few integer operations.
+    """
+    def __init__(self, subBucketBits=4):
+        self.subBucketBits = subBucketBits
+        self.subBuckets = 1 << subBucketBits
+        self.counts = [0] * ((65 - subBucketBits) * self.subBuckets)
+        self.count = 0
+        self.totalNs = 0
+        self.maxNs = 0
+
+    def bucketIndex(self, value):
+        if value < self.subBuckets:
+            return value
+        exponent = value.bit_length() - self.subBucketBits - 1
+        return (exponent + 1) * self.subBuckets + (value >> exponent) - self.subBuckets
+
+    def bucketUpperBound(self, index):
+        if index < self.subBuckets:
+            return index
+        exponent = index // self.subBuckets - 1
+        mantissa = self.subBuckets + index % self.subBuckets
+        return ((mantissa + 1) << exponent) - 1
+
+    def record(self, valueNs):
+        self.counts[self.bucketIndex(valueNs)] += 1
+        self.count += 1
+        self.totalNs += valueNs
+        if valueNs > self.maxNs:
+            self.maxNs = valueNs
+
+    def merge(self, other):
+        for index, count in enumerate(other.counts):
+            if count:
+                self.counts[index] += count
+        self.count += other.count
+        self.totalNs += other.totalNs
+        self.maxNs = max(self.maxNs, other.maxNs)
+
+    def percentile(self, p):
+        """
+          Smallest bucket bound that at least p percent of the recorded
+          values fall under
+        """
+        if self.count == 0:
+            return 0
+        target = max(1, int(round(p / 100.0 * self.count)))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(self.bucketUpperBound(index), self.maxNs)
+        return self.maxNs
+
+    def reset(self):
+        self.counts = [0] * len(self.counts)
+        self.count = 0
+        self.totalNs = 0
+        self.maxNs = 0
+
+    def mean(self):
+        return self.totalNs / float(self.count) if self.count > 0 else 0.0
+
+    def summary(self):
+        return 'p50 %.1f us, p90 %.1f us, p99 %.1f us, max %.1f us over %d calls' % (
+            self.percentile(50) / 1000.0, self.percentile(90) / 1000.0,
+            self.percentile(99) / 1000.0, self.maxNs / 1000.0, self.count)
+
+    def toDict(self):
+        return {'count': self.count, 'totalNs': self.totalNs, 'maxNs': self.maxNs,
+            'p50Ns': self.percentile(50), 'p99Ns': self.percentile(99),
+            'buckets': dict((index, count) for index, count in enumerate(self.counts) if count)}
+
+def timeCalls(method, histogram):
+    """
+      Wraps method so the duration of every call is recorded in histogram
+    """
+    perfCounter = time.perf_counter_ns
+    def timedMethod(*args, **kwargs):
+        start = perfCounter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            histogram.record(perfCounter() - start)
+    return timedMethod
+
+class PhaseProfiler:
+    """
+      Opt-in timing of an agent's hot paths.
+
+      instrument() replaces each named method on the agent instance with a
+      wrapper that times it with perf_counter_ns.  Times are inclusive, so
+      getAction also contains the getFeatureVector calls it makes.  Every
+      phase gets a LatencyHistogram per episode, which is folded into a run
+      histogram when the episode ends.  An agent that is not instrumented
+      pays nothing.
+
+      outputFile - optional path that receives one JSON line per episode
+    """
+    def __init__(self, phases, outputFile=None):
+        self.phases = list(phases)
+        self.outputFile = outputFile
+        self.episodesSoFar = 0
+        self.episodeHistograms = dict((phase, LatencyHistogram()) for phase in self.phases)
+        self.runHistograms = dict((phase, LatencyHistogram()) for phase in self.phases)
+
+    def instrument(self, agent):
+        for phase in self.phases:
+            setattr(agent, phase, timeCalls(getattr(agent, phase), self.episodeHistograms[phase]))
+        registerExitSummary(self)
+
+    def endEpisode(self):
+        """
+          Folds the finished episode into the run totals, writes it to the
+          output file and starts counting the next one
+        """
+        for phase in self.phases:
+            self.runHistograms[phase].merge(self.episodeHistograms[phase])
+
+        if self.outputFile is not None:
+            phases = dict((phase, self.episodeHistograms[phase].toDict()) for phase in self.phases)
+            with open(self.outputFile, 'a') as f:
+                f.write(json.dumps({'episode': self.episodesSoFar, 'phases': phases}) + '\n')
+
+        # Reset in place, the timed wrappers hold on to these histograms
+        for phase in self.phases:
+            self.episodeHistograms[phase].reset()
+        self.episodesSoFar += 1
+
+    def kind(self):
+        return (PhaseProfiler, tuple(self.phases))
+
+    @staticmethod
+    def merged(profilers):
+        """
+          One profiler holding the run totals of profilers of the same phases
+        """
+        total = PhaseProfiler(profilers[0].phases)
+        for profiler in profilers:
+            total.episodesSoFar += profiler.episodesSoFar
+            for phase in total.phases:
+                total.runHistograms[phase].merge(profiler.runHistograms[phase])
+        return total
+
+    def summary(self):
+        lines = ['Phase profile over %d episodes (inclusive times):' % self.episodesSoFar]
+        for phase in self.phases:
+            histogram = self.runHistograms[phase]
+            lines.append('\t%-22s %10.2f s total, %s' % (phase, histogram.totalNs / 1e9, histogram.summary()))
+        return '\n'.join(lines)
+
+    def printSummary(self):
+        if self.episodesSoFar > 0:
+            print(self.summary())
+
+class DecisionLatency:
+    """
+      Records how long every decision of an agent takes, broken down by
+      layout and number of ghosts.
+
+      The agent calls startEpisode from registerInitialState and endEpisode
+      when the episode is over, which returns the episode's percentile
+      summary.  Run-level summaries per (layout, ghosts) are printed with
+      the learning status and when the run ends.
+    """
+    def __init__(self):
+        self.episodeHistogram = LatencyHistogram()
+        self.runHistograms = {}
+        self.gameKey = None
+
+    def instrument(self, agent, method='getAction'):
+        setattr(agent, method, timeCalls(getattr(agent, method), self.episodeHistogram))
+        registerExitSummary(self)
+
+    def startEpisode(self, state):
+        self.gameKey = (layoutName(state.data.layout.layoutText), state.getNumAgents() - 1)
+        self.episodeHistogram.reset()
+
+    def endEpisode(self):
+        if self.gameKey not in self.runHistograms:
+            self.runHistograms[self.gameKey] = LatencyHistogram()
+        self.runHistograms[self.gameKey].merge(self.episodeHistogram)
+        return 'Decision latency: ' + self.episodeHistogram.summary()
+
+    def kind(self):
+        return DecisionLatency
+
+    @staticmethod
+    def merged(recorders):
+        """
+          One recorder holding the run histograms of every recorder
+        """
+        total = DecisionLatency()
+        for recorder in recorders:
+            for gameKey, histogram in recorder.runHistograms.items():
+                if gameKey not in total.runHistograms:
+                    total.runHistograms[gameKey] = LatencyHistogram()
+                total.runHistograms[gameKey].merge(histogram)
+        return total
+
+    def summary(self):
+        lines = ['Decision latency by layout and ghosts:']
+        for (layout, numGhosts), histogram in sorted(self.runHistograms.items()):
+            lines.append('\t%s with %d ghosts: %s' % (layout, numGhosts, histogram.summary()))
+        return '\n'.join(lines)
+
+    def printSummary(self):
+        if self.runHistograms:
+            print(self.summary())
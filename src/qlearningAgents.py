@@ -15,6 +15,8 @@
 from game import *
 from learningAgents import ReinforcementAgent
 from featureExtractors import *
+from featureCache import FeatureCache, stateKey
+from profiling import DecisionLatency, PhaseProfiler, isEnabled
 
 import random,util,math
 
@@ -163,21 +165,54 @@ class ApproximateQAgent(PacmanQAgent):
        and update.  All other QLearningAgent functions
        should work as is.
     """
-    def __init__(self, extractor='IdentityExtractor', **args):
+    def __init__(self, extractor='IdentityExtractor', featureCacheSize=10000, parameterStore=None, paramFile=None, profile=False, profileFile=None, **args):
         self.featExtractor = util.lookup(extractor, globals())()
         PacmanQAgent.__init__(self, **args)
         self.weights = util.Counter()
 
+        # With a shared store the weights live in shared memory, updates are applied lock free
+        self.parameterStore = None
+        if parameterStore is not None:
+            # Imported here, most runs never touch shared memory or checkpoints
+            from parameterStore import ParameterStore
+            self.parameterStore = ParameterStore.attach(parameterStore)
+            self.weights = self.parameterStore.weights('weights')
+        if paramFile is not None:
+            from parameterStore import loadCheckpoint
+            loadCheckpoint(paramFile, self)
+
+        # Every decision is timed, the phase breakdown below is opt-in
+        self.decisionLatency = DecisionLatency()
+        self.decisionLatency.instrument(self)
+
+        self.profiler = None
+        if isEnabled(profile):
+            self.profiler = PhaseProfiler(['getAction', 'getQValue', 'getFeatures', 'update', 'observeTransition'], profileFile)
+            self.profiler.instrument(self)
+
+        # stateKey only covers what SimpleExtractor reads, IdentityExtractor keys on the whole state
+        if extractor != 'SimpleExtractor':
+            featureCacheSize = 0
+        self.featureCache = FeatureCache(featureCacheSize)
+        self.keyedState = None
+        self.keyedStateKey = None
+
     def getWeights(self):
         return self.weights
 
+    def getFeatures(self, state, action):
+        if state is not self.keyedState:
+            self.keyedState = state
+            self.keyedStateKey = stateKey(state)
+        return self.featureCache.lookup((self.keyedStateKey, action), lambda: self.featExtractor.getFeatures(state, action))
+
     def getQValue(self, state, action):
         """
           Should return Q(state,action) = w * featureVector
           where * is the dotProduct operator
         """
         result = 0
-        features = self.featExtractor.getFeatures(state, action)
+        features = self.getFeatures(state, action)
 
         for feature in features:
             result += features[feature] * self.weights[feature]
@@ -188,18 +223,38 @@ class ApproximateQAgent(PacmanQAgent):
         """
            Should update your weights based on transition
         """
-        features = self.featExtractor.getFeatures(state, action)
+        features = self.getFeatures(state, action)
         qValue = self.getQValue(state, action)
         nextStateValue = self.getValue(nextState)
 
         for feature in features:
             self.weights[feature] += self.alpha * (reward + self.discount * nextStateValue - qValue) * features[feature]
 
+        if self.parameterStore is not None:
+            self.parameterStore.bumpVersion('weights')
+
+
+    def registerInitialState(self, state):
+        PacmanQAgent.registerInitialState(self, state)
+        self.decisionLatency.startEpisode(state)
 
     def final(self, state):
         "Called at the end of each game."
         # call the super-class final method
         PacmanQAgent.final(self, state)
+        latency = self.decisionLatency.endEpisode()
+        # Training episodes stay quiet, the run summary covers them
+        if self.episodesSoFar > self.numTraining:
+            print('\t%s' % latency)
+
+        if self.profiler is not None:
+            self.profiler.endEpisode()
+
+        if self.episodesSoFar % 100 == 0:
+            print('\t%s' % self.featureCache.summary())
+            print(self.decisionLatency.summary())
+            if self.profiler is not None:
+                print(self.profiler.summary())
 
         # did we finish training?
         if self.episodesSoFar == self.numTraining:
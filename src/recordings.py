@@ -0,0 +1,275 @@
+import optparse
+import random
+import sys
+import time
+import numpy as np
+import layout
+import pacman
+import textDisplay
+from game import Directions
+from pacman import GameState
+from layoutCompiler import layoutHash, layoutName
+
+# Actions are stored as their index in this list
+ACTIONS = [Directions.NORTH, Directions.SOUTH, Directions.EAST, Directions.WEST, Directions.STOP]
+ACTION_INDICES = dict((action, index) for index, action in enumerate(ACTIONS))
+
+class Recording:
+    """
+      Episodes played on one layout, stored column by column.
+
+      Every move of every agent is a step with the mover's index and its
+      action, which is all the deterministic game engine needs to rebuild
+      the GameStates.  Every pacman move is also a decision, with the seed
+      the random module was reset to before the agent chose and the
+      probability its policy gave the action (NaN for agents without a
+      softmax policy).  episodeStarts and decisionStarts hold where each
+      episode begins in the step and decision columns.  Saved as a
+      compressed .npz file.
+    """
+    def __init__(self, layoutName, layoutHash, numGhosts):
+        self.layoutName = layoutName
+        self.layoutHash = layoutHash
+        self.numGhosts = numGhosts
+        self.agentIndices = np.zeros(0, dtype=np.int8)
+        self.actions = np.zeros(0, dtype=np.int8)
+        self.decisionSeeds = np.zeros(0, dtype=np.uint32)
+        self.behaviourProbabilities = np.zeros(0)
+        self.episodeStarts = np.zeros(1, dtype=np.int64)
+        self.decisionStarts = np.zeros(1, dtype=np.int64)
+        self.scores = np.zeros(0)
+
+    def __len__(self):
+        return len(self.scores)
+
+    def addEpisode(self, moveHistory, decisionSeeds, behaviourProbabilities, score):
+        """
+          moveHistory: the (agentIndex, action) moves of a finished Game
+        """
+        self.agentIndices = np.concatenate([self.agentIndices,
+            np.array([agentIndex for agentIndex, _ in moveHistory], dtype=np.int8)])
+        self.actions = np.concatenate([self.actions,
+            np.array([ACTION_INDICES[action] for _, action in moveHistory], dtype=np.int8)])
+        self.decisionSeeds = np.concatenate([self.decisionSeeds, np.array(decisionSeeds, dtype=np.uint32)])
+        self.behaviourProbabilities = np.concatenate([self.behaviourProbabilities,
+            np.array(behaviourProbabilities, dtype=np.float64)])
+        self.episodeStarts = np.append(self.episodeStarts, len(self.actions))
+        self.decisionStarts = np.append(self.decisionStarts, len(self.decisionSeeds))
+        self.scores = np.append(self.scores, score)
+
+    def episode(self, episode):
+        """
+          Returns the agentIndices, actions, decisionSeeds and
+          behaviourProbabilities columns of one episode
+        """
+        steps = slice(self.episodeStarts[episode], self.episodeStarts[episode + 1])
+        decisions = slice(self.decisionStarts[episode], self.decisionStarts[episode + 1])
+        return (self.agentIndices[steps], self.actions[steps],
+            self.decisionSeeds[decisions], self.behaviourProbabilities[decisions])
+
+    def getLayout(self):
+        """
+          Loads the recorded layout and makes sure it has not changed since
+        """
+        gameLayout = layout.getLayout(self.layoutName)
+        if gameLayout == None:
+            raise Exception("The layout " + self.layoutName + " cannot be found")
+        if layoutHash(gameLayout.layoutText) != self.layoutHash:
+            raise Exception("The layout " + self.layoutName + " has changed since it was recorded")
+        return gameLayout
+
+    def save(self, path):
+        np.savez_compressed(path, layoutName=np.array(self.layoutName), layoutHash=np.array(self.layoutHash),
+            numGhosts=np.array(self.numGhosts), agentIndices=self.agentIndices, actions=self.actions,
+            decisionSeeds=self.decisionSeeds, behaviourProbabilities=self.behaviourProbabilities,
+            episodeStarts=self.episodeStarts, decisionStarts=self.decisionStarts, scores=self.scores)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as columns:
+            recording = cls(str(columns['layoutName']), str(columns['layoutHash']), int(columns['numGhosts']))
+            for name in ['agentIndices', 'actions', 'decisionSeeds', 'behaviourProbabilities',
+                    'episodeStarts', 'decisionStarts', 'scores']:
+                setattr(recording, name, columns[name])
+        return recording
+
+def behaviourProbability(agent, state, action):
+    if hasattr(agent, 'softmaxPolicy'):
+        return agent.softmaxPolicy(state, action)
+    return float('nan')
+
+def recordGames(agent, gameLayout, ghosts, numGames):
+    """
+      Plays numGames normal games and returns their Recording.  Before every
+      decision the random module is reseeded with a fresh seed drawn from
+      it, so a replay can give the agent the same random numbers.
+    """
+    recording = Recording(layoutName(gameLayout.layoutText), layoutHash(gameLayout.layoutText),
+        min(len(ghosts), gameLayout.getNumGhosts()))
+    decisionSeeds = []
+    behaviourProbabilities = []
+
+    getAction = agent.getAction
+    def recordedGetAction(state):
+        seed = random.getrandbits(32)
+        random.seed(seed)
+        action = getAction(state)
+        decisionSeeds.append(seed)
+        behaviourProbabilities.append(behaviourProbability(agent, state, action))
+        return action
+    agent.getAction = recordedGetAction
+
+    rules = pacman.ClassicGameRules()
+    try:
+        for _ in range(numGames):
+            game = rules.newGame(gameLayout, agent, ghosts, textDisplay.NullGraphics(), True)
+            game.run()
+            recording.addEpisode(game.moveHistory, decisionSeeds, behaviourProbabilities, game.state.getScore())
+            del decisionSeeds[:]
+            del behaviourProbabilities[:]
+    finally:
+        agent.getAction = getAction
+    return recording
+
+def replayStates(recording, episode, gameLayout=None):
+    """
+      Rebuilds an episode, yielding (agentIndex, action, state) for every
+      step with the state the move was made in
+    """
+    if gameLayout is None:
+        gameLayout = recording.getLayout()
+    agentIndices, actions, _, _ = recording.episode(episode)
+
+    state = GameState()
+    state.initialize(gameLayout, recording.numGhosts)
+    for agentIndex, action in zip(agentIndices, actions):
+        action = ACTIONS[action]
+        yield int(agentIndex), action, state
+        state = state.generateSuccessor(int(agentIndex), action)
+    yield None, None, state
+
+def replayTransitions(recording, episode, gameLayout=None):
+    """
+      Yields the (state, action, nextState, reward) transitions pacman
+      observed in an episode: nextState is the state of its next decision
+      or the final state and reward the score change in between.  Every
+      state is a copy, like the observations Game.run hands out.
+    """
+    previousState = None
+    for agentIndex, action, state in replayStates(recording, episode, gameLayout):
+        if agentIndex == 0 or agentIndex is None:
+            observation = state.deepCopy()
+            if previousState is not None:
+                yield (previousState, previousAction, observation,
+                    observation.getScore() - previousState.getScore())
+            previousState, previousAction = observation, action
+
+def replayEpisodes(agent, recording, episodes=None):
+    """
+      Feeds the recorded episodes to an agent the way Game.run does, but
+      the game follows the recorded actions instead of the agent's.  The
+      agent gets the recorded random seed before each decision, so an
+      agent starting from the parameters it was recorded with makes the
+      same choices and learns the same way.
+
+      Returns the final states and the number of decisions where the agent
+      chose differently than the recording.
+    """
+    gameLayout = recording.getLayout()
+    if episodes is None:
+        episodes = range(len(recording))
+
+    finalStates = []
+    divergences = 0
+    for episode in episodes:
+        decisionSeeds = recording.episode(episode)[2]
+        decision = 0
+        for agentIndex, action, state in replayStates(recording, episode, gameLayout):
+            if agentIndex is None:
+                agent.final(state)
+                finalStates.append(state)
+            elif agentIndex == 0:
+                if decision == 0:
+                    agent.registerInitialState(state.deepCopy())
+                observation = agent.observationFunction(state.deepCopy())
+                random.seed(int(decisionSeeds[decision]))
+                decision += 1
+                if agent.getAction(observation) != action:
+                    divergences += 1
+                    agent.doAction(observation, action)
+    return finalStates, divergences
+
+def readCommand(argv):
+    """
+      Processes the command used to record or replay games from the command line.
+    """
+    usageStr = """
+    USAGE:      python recordings.py <options>
+    EXAMPLES:   (1) python recordings.py -p ReinforceAgent -l smallClassic -n 50 -o reinforce.npz
+                    - plays and records 50 games
+                (2) python recordings.py -p ReinforceAgent -r reinforce.npz
+                    - replays the recorded games to a fresh ReinforceAgent
+    """
+    parser = optparse.OptionParser(usageStr)
+    parser.add_option('-n', '--numGames', dest='numGames', type='int', default=1,
+                      help='the number of games to record', metavar='GAMES')
+    parser.add_option('-l', '--layout', dest='layout', default='mediumClassic',
+                      help='the LAYOUT_FILE from which to load the map layout', metavar='LAYOUT_FILE')
+    parser.add_option('-p', '--pacman', dest='pacman', default='ReinforceAgent',
+                      help='the agent TYPE in the pacmanAgents module to use', metavar='TYPE')
+    parser.add_option('-g', '--ghosts', dest='ghost', default='RandomGhost',
+                      help='the ghost agent TYPE in the ghostAgents module to use', metavar='TYPE')
+    parser.add_option('-k', '--numghosts', type='int', dest='numGhosts', default=4,
+                      help='The maximum number of ghosts to use')
+    parser.add_option('-a', '--agentArgs', dest='agentArgs',
+                      help='Comma separated values sent to agent. e.g. "opt1=val1,opt2,opt3=val3"')
+    parser.add_option('-x', '--numTraining', dest='numTraining', type='int', default=0,
+                      help='How many episodes are training (suppresses output)')
+    parser.add_option('-f', '--fixRandomSeed', action='store_true', dest='fixRandomSeed', default=False,
+                      help='Fixes the random seed to always play the same game')
+    parser.add_option('-o', '--output', dest='output', default=None,
+                      help='record the games to this .npz file')
+    parser.add_option('-r', '--replay', dest='replay', default=None,
+                      help='replay the games of this .npz file instead of playing')
+
+    options, otherjunk = parser.parse_args(argv)
+    if len(otherjunk) != 0:
+        raise Exception('Command line input not understood: ' + str(otherjunk))
+    if (options.output is None) == (options.replay is None):
+        raise Exception('Give either a file to record to (-o) or one to replay (-r)')
+
+    if options.fixRandomSeed:
+        random.seed('cs188')
+
+    agentOpts = pacman.parseAgentArgs(options.agentArgs)
+    if options.numTraining > 0 and 'numTraining' not in agentOpts:
+        agentOpts['numTraining'] = options.numTraining
+    agent = pacman.loadAgent(options.pacman, True)(**agentOpts)
+    return options, agent
+
+if __name__ == '__main__':
+    options, agent = readCommand(sys.argv[1:])
+
+    startTime = time.time()
+    if options.replay is None:
+        gameLayout = layout.getLayout(options.layout)
+        if gameLayout == None:
+            raise Exception("The layout " + options.layout + " cannot be found")
+        ghostType = pacman.loadAgent(options.ghost, True)
+        recording = recordGames(agent, gameLayout, [ghostType(i + 1) for i in range(options.numGhosts)], options.numGames)
+        recording.save(options.output)
+        scores = list(recording.scores)
+    else:
+        recording = Recording.load(options.replay)
+        finalStates, divergences = replayEpisodes(agent, recording)
+        scores = [state.getScore() for state in finalStates]
+    elapsed = time.time() - startTime
+
+    print('Average Score:', sum(scores) / float(len(scores)))
+    print('Scores:       ', ', '.join([str(score) for score in scores]))
+    if options.replay is None:
+        print('Recorded %d games with %d steps to %s' % (len(recording), len(recording.actions), options.output))
+    else:
+        print('Replayed %d games, the agent chose differently in %d of %d decisions' % (
+            len(recording), divergences, len(recording.decisionSeeds)))
+    print('Took %.2f seconds' % elapsed)
@@ -0,0 +1,110 @@
+import ast
+import hashlib
+import json
+import os
+import tempfile
+from layoutCompiler import LAYOUT_DIR, layoutHash, readLayoutText
+
+SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.path.join(SOURCE_DIR, 'resultCache')
+
+# The game engine runs every agent whatever the agent module imports, pacman.py loads agents by name
+ENGINE_MODULES = ['pacman', 'game', 'ghostAgents', 'layout', 'experiments']
+
+_moduleTrees = {}
+
+def moduleTree(moduleName):
+    """
+      ast.dump of a module in SOURCE_DIR, so formatting and comments do not
+      count as changes.  None for modules outside the repository.
+    """
+    if moduleName not in _moduleTrees:
+        path = os.path.join(SOURCE_DIR, moduleName + '.py')
+        if os.path.exists(path):
+            with open(path) as f:
+                _moduleTrees[moduleName] = ast.parse(f.read(), path)
+        else:
+            _moduleTrees[moduleName] = None
+    return _moduleTrees[moduleName]
+
+def importedModules(tree):
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                yield alias.name.split('.')[0]
+        elif isinstance(node, ast.ImportFrom) and node.module is not None and node.level == 0:
+            yield node.module.split('.')[0]
+
+def agentModule(agentName):
+    """
+      The module defining an agent, looked up like pacman.loadAgent does
+      among the *gents.py files, but by parsing instead of importing them
+    """
+    for f in sorted(os.listdir(SOURCE_DIR)):
+        if f.endswith('gents.py'):
+            tree = moduleTree(f[:-3])
+            if any(isinstance(node, ast.ClassDef) and node.name == agentName for node in tree.body):
+                return f[:-3]
+    raise Exception('The agent ' + agentName + ' is not specified in any *Agents.py.')
+
+def sourceHash(agentName):
+    """
+      Hash of the syntax trees of the agent's module, the ENGINE_MODULES
+      and every repository module they import, directly or not, so a
+      change to the agent or to the code it runs on invalidates its results
+    """
+    pending = [agentModule(agentName)] + ENGINE_MODULES
+    seen = set()
+    while pending:
+        moduleName = pending.pop()
+        if moduleName in seen or moduleTree(moduleName) is None:
+            continue
+        seen.add(moduleName)
+        pending.extend(importedModules(moduleTree(moduleName)))
+
+    digest = hashlib.sha256()
+    for moduleName in sorted(seen):
+        digest.update(moduleName.encode('utf-8'))
+        digest.update(ast.dump(moduleTree(moduleName)).encode('utf-8'))
+    return digest.hexdigest()
+
+def experimentKey(agentName, agentArgs, layoutName, numGhosts, numGames, numTraining, seed, ghostType='RandomGhost'):
+    """
+      Content address of the scores of one run.  agentArgs is the
+      comma separated string given to pacman.py -a.
+    """
+    layoutPath = os.path.join(LAYOUT_DIR, layoutName + '.lay')
+    description = {
+        'agent': agentName,
+        'agentSource': sourceHash(agentName),
+        'agentArgs': sorted(arg for arg in agentArgs.split(',') if arg),
+        'layout': layoutHash(readLayoutText(layoutPath)) if os.path.exists(layoutPath) else layoutName,
+        'ghostType': ghostType,
+        'numGhosts': numGhosts,
+        'numGames': numGames,
+        'numTraining': numTraining,
+        'seed': seed,
+    }
+    return hashlib.sha256(json.dumps(description, sort_keys=True).encode('utf-8')).hexdigest()
+
+def resultPath(key, cacheDir=CACHE_DIR):
+    return os.path.join(cacheDir, key[:2], key + '.json')
+
+def loadResult(key, cacheDir=CACHE_DIR):
+    """
+      The cached scores of a run, or None when it has not been played
+    """
+    try:
+        with open(resultPath(key, cacheDir)) as f:
+            return json.load(f)['scores']
+    except (OSError, ValueError, KeyError):
+        return None
+
+def saveResult(key, scores, cacheDir=CACHE_DIR):
+    path = resultPath(key, cacheDir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Written to a temporary file and renamed so a reader never sees half a result
+    descriptor, tempPath = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(descriptor, 'w') as f:
+        json.dump({'scores': list(scores)}, f)
+    os.replace(tempPath, path)
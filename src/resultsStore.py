@@ -0,0 +1,155 @@
+import json
+import os
+import time
+import numpy as np
+from parameterStore import AGENT_PARAMETERS
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+# Per-episode columns and their dtypes, parameters is episodes x parameters
+COLUMNS = {
+    'score': np.float64,
+    'win': np.bool_,
+    'steps': np.int32,
+    'time': np.float64,
+    'parameters': np.float64,
+}
+
+def parameterNames(agentName):
+    """
+      Names of the entries of parameterVector, e.g. theta[0] or weights[bias]
+    """
+    names = []
+    for arrayName, spec in AGENT_PARAMETERS.get(agentName, {}).items():
+        keys = range(spec) if isinstance(spec, int) else spec
+        names.extend('%s[%s]' % (arrayName, key) for key in keys)
+    return names
+
+def parameterVector(agent):
+    """
+      Every parameter of an agent (see AGENT_PARAMETERS) in one flat array
+    """
+    values = []
+    for arrayName, spec in AGENT_PARAMETERS.get(type(agent).__name__, {}).items():
+        parameters = getattr(agent, arrayName)
+        if isinstance(spec, int):
+            values.extend(float(value) for value in parameters)
+        else:
+            values.extend(float(parameters[key]) for key in spec)
+    return np.array(values, dtype=np.float64)
+
+class EpisodeRecorder:
+    """
+      Wraps a pacman agent and keeps a row for every episode it plays: the
+      final score, whether it won, the number of pacman moves, the wall
+      time and the agent's parameters after learning from the episode.
+      Everything else is passed through to the agent.
+    """
+    def __init__(self, agent):
+        self.agent = agent
+        self.rows = []
+        self.steps = 0
+        self.startTime = time.perf_counter()
+
+    def __getattr__(self, name):
+        return getattr(self.agent, name)
+
+    def __dir__(self):
+        # Game looks hooks like observationFunction up with dir()
+        return sorted(set(object.__dir__(self)) | set(dir(self.agent)))
+
+    def registerInitialState(self, state):
+        self.steps = 0
+        self.startTime = time.perf_counter()
+        return self.agent.registerInitialState(state)
+
+    def getAction(self, state):
+        self.steps += 1
+        return self.agent.getAction(state)
+
+    def final(self, state):
+        self.agent.final(state)
+        self.rows.append([state.getScore(), state.isWin(), self.steps, time.perf_counter() - self.startTime,
+            parameterVector(self.agent).tolist()])
+
+class ResultsStore:
+    """
+      Per-episode results of many runs, stored column by column.  Every run
+      is a directory of .npy files, one per column of COLUMNS, and
+      index.jsonl holds one line per run describing it (agent, layout,
+      ghosts, seed, episodes, parameter names).  Columns are loaded memory
+      mapped, so slicing a few episodes of many runs only reads those.
+      Run ids are derived from the run's configuration, so a replayed run
+      overwrites its columns and only its latest index line counts.
+    """
+    def __init__(self, path=RESULTS_DIR):
+        self.path = path
+
+    def index(self):
+        entries = {}
+        indexPath = os.path.join(self.path, 'index.jsonl')
+        if os.path.exists(indexPath):
+            with open(indexPath) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A line a crash cut short, its run is incomplete
+                        continue
+                    # A replayed run has the same id, its latest line replaces the earlier one
+                    entries[entry['run']] = entry
+        return list(entries.values())
+
+    def runs(self, **filters):
+        """
+          Index entries of the runs matching every filter, e.g.
+          runs(agent='ReinforceAgent', numGhosts=2)
+        """
+        return [entry for entry in self.index() if all(entry.get(key) == value for key, value in filters.items())]
+
+    def addRun(self, runId, rows, **description):
+        """
+          Writes the EpisodeRecorder rows of a run and adds it to the index.
+          The columns are written before the index line, so readers never
+          see a run without its data.
+        """
+        runDir = os.path.join(self.path, 'runs', runId)
+        os.makedirs(runDir, exist_ok=True)
+        columns = {
+            'score': [row[0] for row in rows],
+            'win': [row[1] for row in rows],
+            'steps': [row[2] for row in rows],
+            'time': [row[3] for row in rows],
+            'parameters': [row[4] for row in rows],
+        }
+        for name, values in columns.items():
+            np.save(os.path.join(runDir, name + '.npy'), np.array(values, dtype=COLUMNS[name]))
+
+        entry = dict(description, run=runId, numEpisodes=len(rows))
+        # One short append per run, so runs finishing in parallel do not interleave lines
+        with open(os.path.join(self.path, 'index.jsonl'), 'a') as f:
+            f.write(json.dumps(entry) + '\n')
+        return entry
+
+    def column(self, entry, name):
+        """
+          A read-only memory map of one column of a run
+        """
+        return np.load(os.path.join(self.path, 'runs', entry['run'], name + '.npy'), mmap_mode='r')
+
+    def matrix(self, name, episodes=slice(None), **filters):
+        """
+          The column of every matching run as a runs x episodes array (runs x
+          episodes x parameters for parameters), reading only the episodes
+          sliced.  Runs shorter than the longest are padded with NaN.
+        """
+        columns = [self.column(entry, name)[episodes] for entry in self.runs(**filters)]
+        if len(columns) == 0:
+            return np.zeros((0, 0))
+        # Runs without episodes save parameters as (0,), the trailing shape comes from the longest run
+        longest = max(columns, key=len)
+        result = np.full((len(columns), len(longest)) + longest.shape[1:], np.nan)
+        for row, column in enumerate(columns):
+            if len(column) > 0:
+                result[row, :len(column)] = column
+        return result
@@ -0,0 +1,164 @@
+import optparse
+import random
+import sys
+import time
+import numpy as np
+import layout
+import pacman
+from pacman import GameState
+from trajectory import TrajectoryBuffer, MAX_ACTIONS
+from policyMath import batchActionProbabilities, sampleActions
+
+class LockstepGame:
+    """
+      One of the games advanced together by playLockstepBatch.  A round
+      is pacman's move followed by every ghost's, so the reward of a step is
+      the score change pacman sees before its next decision, exactly like
+      observationFunction computes it during a normal game.
+    """
+    def __init__(self, layout, ghosts, numFeatures):
+        self.state = GameState()
+        self.state.initialize(layout, len(ghosts))
+        self.ghosts = ghosts[:layout.getNumGhosts()]
+        self.trajectory = TrajectoryBuffer(numFeatures)
+        self.episodeRewards = 0.0
+
+    def isOver(self):
+        return self.state.isWin() or self.state.isLose()
+
+    def step(self, action):
+        lastScore = self.state.getScore()
+        self.state = self.state.generateSuccessor(0, action)
+        for ghost in self.ghosts:
+            if self.isOver():
+                break
+            self.state = self.state.generateSuccessor(ghost.index, ghost.getAction(self.state))
+
+        reward = self.state.getScore() - lastScore
+        self.episodeRewards += reward
+        return reward
+
+def playLockstepBatch(agent, layout, ghosts, numGames):
+    """
+      Plays numGames games at once with a softmax policy agent (one exposing
+      theta, getLegalActions and getFeatureVector) without updating it.
+
+      Every round the action-feature matrices of all unfinished games are
+      stacked, one vectorized softmax picks all of their actions and the
+      actions are scattered back to the games.  Returns the finished
+      LockstepGames with their trajectories.
+    """
+    numFeatures = len(agent.theta)
+    batch = [LockstepGame(layout, ghosts, numFeatures) for _ in range(numGames)]
+
+    while True:
+        active = [game for game in batch if not game.isOver()]
+        if not active:
+            return batch
+
+        # The feature extractors write capsules into the food grid, so they get a copy like in Game.run
+        observations = [game.state.deepCopy() for game in active]
+        legalActions = [agent.getLegalActions(observation) for observation in observations]
+        actionFeatures = [[agent.getFeatureVector(observation, action) for action in actions]
+            for observation, actions in zip(observations, legalActions)]
+
+        numActions = np.array([len(actions) for actions in legalActions])
+        stackedFeatures = np.zeros((len(active), MAX_ACTIONS, numFeatures))
+        for k in range(len(active)):
+            stackedFeatures[k, :numActions[k]] = actionFeatures[k]
+
+        probabilities = batchActionProbabilities(stackedFeatures, numActions, agent.theta)
+        actionIndices = sampleActions(probabilities, numActions, [random.random() for _ in active])
+
+        for k, game in enumerate(active):
+            actionIndex = int(actionIndices[k])
+            reward = game.step(legalActions[k][actionIndex])
+            game.trajectory.append(actionFeatures[k], actionIndex, reward)
+
+def runLockstepEpisodes(agent, layout, ghosts, numGames, batchSize=16):
+    """
+      Plays numGames games batchSize at a time with playLockstepBatch.
+      Agents that learn from whole episodes (ReinforceAgent) are updated
+      once each batch is over, so every update sees batchSize episodes
+      played with the same theta.
+
+      Returns the finished games' final states.
+    """
+    learnsFromEpisodes = hasattr(agent, 'trajectory')
+    if not learnsFromEpisodes:
+        print('%s learns from single transitions, batched rollouts only evaluate its policy' % type(agent).__name__)
+
+    finalStates = []
+    while len(finalStates) < numGames:
+        for game in playLockstepBatch(agent, layout, ghosts, min(batchSize, numGames - len(finalStates))):
+            if learnsFromEpisodes:
+                agent.stopEpisode(game.trajectory, game.episodeRewards)
+            finalStates.append(game.state)
+
+    return finalStates
+
+def readCommand(argv):
+    """
+      Processes the command used to run batched rollouts from the command line.
+    """
+    usageStr = """
+    USAGE:      python rollouts.py <options>
+    EXAMPLES:   python rollouts.py -p ReinforceAgent -l smallClassic -k 2 -n 160 -b 16 -a alpha=0.2,gamma=0.8
+    """
+    parser = optparse.OptionParser(usageStr)
+    parser.add_option('-n', '--numGames', dest='numGames', type='int', default=1,
+                      help='the number of games to play', metavar='GAMES')
+    parser.add_option('-b', '--batchSize', dest='batchSize', type='int', default=16,
+                      help='the number of games advanced in lockstep', metavar='BATCH')
+    parser.add_option('-l', '--layout', dest='layout', default='mediumClassic',
+                      help='the LAYOUT_FILE from which to load the map layout', metavar='LAYOUT_FILE')
+    parser.add_option('-p', '--pacman', dest='pacman', default='ReinforceAgent',
+                      help='the agent TYPE in the pacmanAgents module to use', metavar='TYPE')
+    parser.add_option('-g', '--ghosts', dest='ghost', default='RandomGhost',
+                      help='the ghost agent TYPE in the ghostAgents module to use', metavar='TYPE')
+    parser.add_option('-k', '--numghosts', type='int', dest='numGhosts', default=4,
+                      help='The maximum number of ghosts to use')
+    parser.add_option('-a', '--agentArgs', dest='agentArgs',
+                      help='Comma separated values sent to agent. e.g. "opt1=val1,opt2,opt3=val3"')
+    parser.add_option('-x', '--numTraining', dest='numTraining', type='int', default=0,
+                      help='How many episodes are training (suppresses output)')
+    parser.add_option('-f', '--fixRandomSeed', action='store_true', dest='fixRandomSeed', default=False,
+                      help='Fixes the random seed to always play the same game')
+
+    options, otherjunk = parser.parse_args(argv)
+    if len(otherjunk) != 0:
+        raise Exception('Command line input not understood: ' + str(otherjunk))
+
+    if options.fixRandomSeed:
+        random.seed('cs188')
+
+    args = dict()
+    args['layout'] = layout.getLayout(options.layout)
+    if args['layout'] == None:
+        raise Exception("The layout " + options.layout + " cannot be found")
+
+    agentOpts = pacman.parseAgentArgs(options.agentArgs)
+    if options.numTraining > 0 and 'numTraining' not in agentOpts:
+        agentOpts['numTraining'] = options.numTraining
+    args['agent'] = pacman.loadAgent(options.pacman, True)(**agentOpts)
+
+    ghostType = pacman.loadAgent(options.ghost, True)
+    args['ghosts'] = [ghostType(i + 1) for i in range(options.numGhosts)]
+    args['numGames'] = options.numGames
+    args['batchSize'] = options.batchSize
+    return args
+
+if __name__ == '__main__':
+    args = readCommand(sys.argv[1:])
+
+    startTime = time.time()
+    finalStates = runLockstepEpisodes(**args)
+    elapsed = time.time() - startTime
+
+    scores = [state.getScore() for state in finalStates]
+    wins = [state.isWin() for state in finalStates]
+    print('Average Score:', sum(scores) / float(len(scores)))
+    print('Scores:       ', ', '.join([str(score) for score in scores]))
+    print('Win Rate:      %d/%d (%.2f)' % (wins.count(True), len(wins), wins.count(True) / float(len(wins))))
+    print('Record:       ', ', '.join([['Loss', 'Win'][int(w)] for w in wins]))
+    print('Rollouts took %.2f seconds' % elapsed)
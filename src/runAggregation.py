@@ -0,0 +1,126 @@
+import math
+from itertools import combinations
+import numpy as np
+
+class ScoreAggregator:
+    """
+      Folds the per-episode scores of finished runs into running means and
+      variances with Welford's algorithm, one per episode, so no run has
+      to be kept.  The mean score of every run is also folded into a
+      running mean and variance, and kept by run index for paired
+      comparisons.
+    """
+    def __init__(self, numEpisodes):
+        self.counts = np.zeros(numEpisodes)
+        self.means = np.zeros(numEpisodes)
+        self.m2 = np.zeros(numEpisodes)
+
+        self.runMeans = {}
+        self.runCount = 0
+        self.runMean = 0.0
+        self.runM2 = 0.0
+
+    def add(self, runIndex, scores):
+        scores = np.asarray(scores, dtype=np.float64)[:len(self.means)]
+        if len(scores) == 0:
+            return
+        episodes = slice(0, len(scores))
+        self.counts[episodes] += 1
+        delta = scores - self.means[episodes]
+        self.means[episodes] += delta / self.counts[episodes]
+        self.m2[episodes] += delta * (scores - self.means[episodes])
+
+        runMean = float(scores.mean())
+        self.runMeans[runIndex] = runMean
+        self.runCount += 1
+        delta = runMean - self.runMean
+        self.runMean += delta / self.runCount
+        self.runM2 += delta * (runMean - self.runMean)
+
+    def runVariance(self):
+        return self.runM2 / (self.runCount - 1) if self.runCount > 1 else float('nan')
+
+    def episodeVariances(self):
+        return np.where(self.counts > 1, self.m2 / np.maximum(self.counts - 1, 1), np.nan)
+
+    def interval(self, confidence=0.95):
+        """
+          Half width of the t confidence interval of the mean run score,
+          infinite until there are two runs
+        """
+        if self.runCount < 2:
+            return float('inf')
+        from scipy import stats
+        quantile = stats.t.ppf((1 + confidence) / 2.0, self.runCount - 1)
+        return float(quantile * math.sqrt(self.runVariance() / self.runCount))
+
+    def episodeIntervals(self, confidence=0.95):
+        from scipy import stats
+        quantiles = stats.t.ppf((1 + confidence) / 2.0, np.maximum(self.counts - 1, 1))
+        return np.where(self.counts > 1, quantiles * np.sqrt(self.episodeVariances() / np.maximum(self.counts, 1)), np.inf)
+
+    def summary(self, confidence=0.95):
+        return 'mean run score %.1f +/- %.1f (%d%% CI) over %d runs' % (
+            self.runMean, self.interval(confidence), round(100 * confidence), self.runCount)
+
+class SequentialStopping:
+    """
+      Decides when a comparison of agents has been answered, looking again
+      every time the agent with the fewest runs finishes one.
+
+      A pair of agents is decided once a t-test on their run means (paired
+      by run index with common random numbers, Welch's otherwise) is
+      significant at alpha divided by the number of looks that can happen,
+      which keeps the chance of any false decision over all the looks below
+      alpha.  The comparison stops when every pair is decided, or when
+      every agent's confidence interval is narrower than +/- targetWidth.
+    """
+    def __init__(self, names, maxRuns, alpha=0.05, targetWidth=None, minRuns=5, paired=False):
+        self.names = list(names)
+        self.alpha = alpha
+        self.targetWidth = targetWidth
+        self.minRuns = minRuns
+        self.paired = paired
+        self.lookAlpha = alpha / max(maxRuns - minRuns + 1, 1)
+        self.looks = 0
+        self.lastLookRuns = 0
+        self.decisions = {}
+
+    def pValue(self, first, second):
+        from scipy import stats
+        if self.paired:
+            runIndices = sorted(set(first.runMeans) & set(second.runMeans))
+            if len(runIndices) < 2:
+                return 1.0
+            return stats.ttest_rel([first.runMeans[i] for i in runIndices], [second.runMeans[i] for i in runIndices])[1]
+        return stats.ttest_ind_from_stats(first.runMean, math.sqrt(first.runVariance()), first.runCount,
+            second.runMean, math.sqrt(second.runVariance()), second.runCount, equal_var=False)[1]
+
+    def update(self, aggregators):
+        """
+          aggregators: dict from agent name to its ScoreAggregator.
+          Returns True once the comparison is answered.
+        """
+        fewestRuns = min(aggregators[name].runCount for name in self.names)
+        if fewestRuns < self.minRuns or fewestRuns == self.lastLookRuns:
+            return False
+        self.lastLookRuns = fewestRuns
+        self.looks += 1
+
+        for key1, key2 in combinations(self.names, 2):
+            if (key1, key2) in self.decisions:
+                continue
+            first, second = aggregators[key1], aggregators[key2]
+            p_value = self.pValue(first, second)
+            if p_value < self.lookAlpha:
+                better = key1 if first.runMean > second.runMean else key2
+                self.decisions[(key1, key2)] = f'{better} scores higher than the other of {key1} and {key2} (p = {p_value:.2g} after {fewestRuns} runs)'
+                print('Decided:', self.decisions[(key1, key2)])
+
+        if len(self.decisions) == len(list(combinations(self.names, 2))):
+            print('Every comparison is decided, stopping')
+            return True
+        if self.targetWidth is not None and all(aggregators[name].interval() < self.targetWidth for name in self.names):
+            print('Every confidence interval is narrower than +/- %.1f, stopping' % self.targetWidth)
+            return True
+        return False
@@ -0,0 +1,185 @@
+import json
+import multiprocessing
+import optparse
+import os
+import random
+import resource
+import sys
+import time
+import layout
+import pacman
+import textDisplay
+from experiments import AGENTS
+from layoutCompiler import LAYOUT_DIR, compileLayoutFile
+
+LAYOUTS = ['smallGrid', 'smallClassic', 'mediumClassic', 'originalClassic']
+GHOST_COUNTS = [1, 2, 3, 4]
+
+# Higher is better for throughput, lower is better for memory
+METRICS = {'stepsPerSecond': 1, 'episodesPerMinute': 1, 'peakRssMb': -1}
+
+DEFAULT_BASELINE = 'scalingBaseline.json'
+
+def runCell(agentName, layoutName, numGhosts, numGames, seed, results):
+    """
+      Plays numGames learning games in this (fresh) process and sends the
+      throughput and peak memory back through results
+    """
+    # The agents print every episode, only the measurements matter here
+    sys.stdout = open(os.devnull, 'w')
+    random.seed(seed)
+
+    gameLayout = layout.getLayout(layoutName)
+    agentOpts = pacman.parseAgentArgs(AGENTS[agentName])
+    agentOpts['numTraining'] = numGames
+    agent = pacman.loadAgent(agentName, True)(**agentOpts)
+    ghostType = pacman.loadAgent('RandomGhost', True)
+    ghosts = [ghostType(i + 1) for i in range(numGhosts)]
+
+    startTime = time.perf_counter()
+    games = pacman.runGames(gameLayout, agent, ghosts, textDisplay.NullGraphics(), numGames, False)
+    elapsed = time.perf_counter() - startTime
+
+    steps = sum(1 for game in games for agentIndex, action in game.moveHistory if agentIndex == 0)
+    results.send({
+        'steps': steps,
+        'seconds': elapsed,
+        'stepsPerSecond': steps / elapsed,
+        'episodesPerMinute': 60.0 * numGames / elapsed,
+        # ru_maxrss is in kilobytes on Linux
+        'peakRssMb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+    })
+
+def measureCell(agentName, layoutName, numGhosts, numGames, seed):
+    """
+      Runs one cell of the matrix in its own spawned process, so the peak
+      RSS of one cell never includes another's
+    """
+    context = multiprocessing.get_context('spawn')
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=runCell, args=(agentName, layoutName, numGhosts, numGames, seed, sender))
+    process.start()
+    sender.close()
+    try:
+        measurement = receiver.recv()
+    except EOFError:
+        raise Exception('The %s run on %s with %d ghosts failed' % (agentName, layoutName, numGhosts))
+    finally:
+        process.join()
+    return measurement
+
+def cellKey(agentName, layoutName, numGhosts):
+    return '%s/%s/%d' % (agentName, layoutName, numGhosts)
+
+def runMatrix(agentNames, layoutNames, ghostCounts, numGames, seed):
+    """
+      Measures every agent on every layout with every ghost count.  Ghost
+      counts above what a layout has room for play the same game as the
+      layout's maximum, so they are skipped.
+    """
+    cells = {}
+    for layoutName in layoutNames:
+        gameLayout = layout.getLayout(layoutName)
+        if gameLayout == None:
+            raise Exception("The layout " + layoutName + " cannot be found")
+        compileLayoutFile(os.path.join(LAYOUT_DIR, layoutName + '.lay'))
+
+        for numGhosts in ghostCounts:
+            if numGhosts > gameLayout.getNumGhosts():
+                continue
+            for agentName in agentNames:
+                measurement = measureCell(agentName, layoutName, numGhosts, numGames, seed)
+                cells[cellKey(agentName, layoutName, numGhosts)] = measurement
+                print('%-18s %-16s %d ghosts: %9.1f steps/s %8.1f episodes/min %8.1f MB peak RSS' % (
+                    agentName, layoutName, numGhosts, measurement['stepsPerSecond'],
+                    measurement['episodesPerMinute'], measurement['peakRssMb']))
+    return cells
+
+def findRegressions(baseline, cells, tolerance):
+    """
+      Returns a message for every metric that is worse than the baseline by
+      more than tolerance (a fraction of the baseline value)
+    """
+    regressions = []
+    for key, measurement in sorted(cells.items()):
+        if key not in baseline['cells']:
+            continue
+        for metric, direction in METRICS.items():
+            before = baseline['cells'][key][metric]
+            change = direction * (measurement[metric] - before) / before
+            if change < -tolerance:
+                regressions.append('%s %s: %.1f -> %.1f (%+.1f%%)' % (key, metric, before,
+                    measurement[metric], 100.0 * (measurement[metric] - before) / before))
+    return regressions
+
+def readCommand(argv):
+    """
+      Processes the command used to run the scaling benchmark from the command line.
+    """
+    usageStr = """
+    USAGE:      python scalingBenchmark.py <options>
+    EXAMPLES:   (1) python scalingBenchmark.py --save
+                    - measures the whole matrix and records it as the baseline
+                (2) python scalingBenchmark.py -p ReinforceAgent -l smallClassic,mediumClassic
+                    - measures part of the matrix and fails on regressions against the baseline
+    """
+    parser = optparse.OptionParser(usageStr)
+    parser.add_option('-p', '--agents', dest='agents', default=','.join(AGENTS),
+                      help='comma separated agents to measure')
+    parser.add_option('-l', '--layouts', dest='layouts', default=','.join(LAYOUTS),
+                      help='comma separated layouts to measure')
+    parser.add_option('-k', '--numghosts', dest='ghostCounts', default=','.join(str(k) for k in GHOST_COUNTS),
+                      help='comma separated ghost counts to measure')
+    parser.add_option('-n', '--numGames', dest='numGames', type='int', default=5,
+                      help='the number of games played in every cell', metavar='GAMES')
+    parser.add_option('-s', '--seed', dest='seed', type='int', default=0,
+                      help='the random seed every cell starts from')
+    parser.add_option('-b', '--baseline', dest='baseline', default=DEFAULT_BASELINE,
+                      help='the baseline file to compare with or save to')
+    parser.add_option('-t', '--tolerance', dest='tolerance', type='float', default=0.1,
+                      help='the fraction a metric may get worse before the run fails')
+    parser.add_option('--save', action='store_true', dest='save', default=False,
+                      help='record this run as the baseline instead of comparing with it')
+
+    options, otherjunk = parser.parse_args(argv)
+    if len(otherjunk) != 0:
+        raise Exception('Command line input not understood: ' + str(otherjunk))
+    for agentName in options.agents.split(','):
+        if agentName not in AGENTS:
+            raise Exception('No scaling configuration for the agent ' + agentName)
+    return options
+
+if __name__ == '__main__':
+    options = readCommand(sys.argv[1:])
+    cells = runMatrix(options.agents.split(','), options.layouts.split(','),
+        [int(k) for k in options.ghostCounts.split(',')], options.numGames, options.seed)
+
+    if options.save:
+        baseline = {'numGames': options.numGames, 'seed': options.seed, 'cells': cells}
+        if os.path.exists(options.baseline):
+            with open(options.baseline) as f:
+                previous = json.load(f)
+            # Cells that were not measured this time keep their old numbers
+            if previous['numGames'] == options.numGames and previous['seed'] == options.seed:
+                baseline['cells'] = dict(previous['cells'], **cells)
+        with open(options.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print('Saved %d cells to %s' % (len(cells), options.baseline))
+        sys.exit(0)
+
+    if not os.path.exists(options.baseline):
+        print('No baseline at %s, run with --save to record one' % options.baseline)
+        sys.exit(0)
+
+    with open(options.baseline) as f:
+        baseline = json.load(f)
+    if baseline['numGames'] != options.numGames or baseline['seed'] != options.seed:
+        raise Exception('The baseline was recorded with %d games and seed %d' % (baseline['numGames'], baseline['seed']))
+
+    regressions = findRegressions(baseline, cells, options.tolerance)
+    if regressions:
+        print('Regressions beyond %.0f%%:' % (100 * options.tolerance))
+        for regression in regressions:
+            print('\t' + regression)
+        sys.exit(1)
+    print('No regressions beyond %.0f%% against %s' % (100 * options.tolerance, options.baseline))
@@ -1,10 +1,11 @@
-from scipy import stats
 import subprocess
-import matplotlib.pyplot as plt  # Common import for matplotlib
 import numpy as np
 import random
 import os
 from itertools import combinations
+from layoutCompiler import compileLayoutFile
+from resultCache import experimentKey, loadResult, saveResult
+from runAggregation import ScoreAggregator
 # Generating layouts
 filenames=os.listdir("layouts")
 val2=[]
@@ -15,36 +16,48 @@ for f in filenames:
 float_listr=[]
 
 amountOfRuns = 1
+# Stop running an agent once its confidence interval is narrower than +/- targetWidth (None runs them all)
+targetWidth = None
+# Serve runs whose agent code and configuration are unchanged from the result cache
+useResultCache = True
 
 # randomLayout=random.choice(laylay)
 randomLayout = "mediumClassic"
 
+# Compile once up front so every pacman.py run memory maps the same artifact
+compileLayoutFile(os.path.join("layouts", randomLayout + ".lay"))
+
 numberOfEpisodes=500
 trainEpisodes=0
 command= [
     "python pacman.py -p ReinforceAgent -n {0} -x {1} -a alpha=0.2,gamma=0.8 -q -l {2}".format(numberOfEpisodes, trainEpisodes, randomLayout)
     ]
 
-reinforceScores = [0]*numberOfEpisodes
+reinforceScores = ScoreAggregator(numberOfEpisodes)
 for i in range(amountOfRuns):
-    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True)
-    print("ReinforceAgent stderr: ", result.stderr)
+    key = experimentKey("ReinforceAgent", "alpha=0.2,gamma=0.8", randomLayout, None, numberOfEpisodes, trainEpisodes, f"run-{i}")
+    float_list1 = loadResult(key) if useResultCache else None
+    if float_list1 is None:
+        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True)
+        print("ReinforceAgent stderr: ", result.stderr)
         
-    float_list1 = []
-    for line in result.stdout.decode('utf-8').splitlines():
-        if 'Scores:' in line:
-            value1 = (line.split(":")[1].strip())  # Extract integer value
-            value2 = (value1.split(", "))
-            float_list1=[float(value) for value in value2] 
+        float_list1 = []
+        for line in result.stdout.decode('utf-8').splitlines():
+            if 'Scores:' in line:
+                value1 = (line.split(":")[1].strip())  # Extract integer value
+                value2 = (value1.split(", "))
+                float_list1=[float(value) for value in value2] 
+        if float_list1:
+            saveResult(key, float_list1)
 
-    for j in range(len(float_list1)):
-        reinforceScores[j] += float_list1[j]
+    reinforceScores.add(i, float_list1)
 
-    print(f"Finished reinforce {i}. \n\t Mean Score: ", np.mean(float_list1))
+    print(f"Finished reinforce {i}. \n\t Mean Score: ", np.mean(float_list1), "\n\t", reinforceScores.summary())
+    if targetWidth is not None and reinforceScores.interval() < targetWidth:
+        break
 
 # Averages score
-for j in range(len(reinforceScores)):
-    reinforceScores[j] /= amountOfRuns 
+reinforceScores = reinforceScores.means
 
 ###########################################        
 ###########################################
@@ -55,26 +68,31 @@ command= [
         "python pacman.py -p ApproximateQAgent -a extractor=SimpleExtractor -n {0} -x {1} -q -l {2}".format(numberOfEpisodes, trainEpisodes, randomLayout)
     ]
 
-qAgentScores = [0]*numberOfEpisodes
+qAgentScores = ScoreAggregator(numberOfEpisodes)
 for i in range(amountOfRuns):
-    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True)
-    print("ApproximateQAgent stderr: ", result.stderr)
+    key = experimentKey("ApproximateQAgent", "extractor=SimpleExtractor", randomLayout, None, numberOfEpisodes, trainEpisodes, f"run-{i}")
+    float_list2 = loadResult(key) if useResultCache else None
+    if float_list2 is None:
+        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True)
+        print("ApproximateQAgent stderr: ", result.stderr)
         
-    float_list2 = []
-    for line in result.stdout.decode('utf-8').splitlines():
-        if 'Scores:' in line:
-            value1 = (line.split(":")[1].strip())  # Extract integer value
-            value2 = (value1.split(", "))
-            float_list2=[float(value) for value in value2] 
+        float_list2 = []
+        for line in result.stdout.decode('utf-8').splitlines():
+            if 'Scores:' in line:
+                value1 = (line.split(":")[1].strip())  # Extract integer value
+                value2 = (value1.split(", "))
+                float_list2=[float(value) for value in value2] 
+        if float_list2:
+            saveResult(key, float_list2)
 
-    for j in range(len(float_list2)):
-        qAgentScores[j] += float_list2[j]
+    qAgentScores.add(i, float_list2)
 
-    print(f"Finished ApproximateQAgent {i}. \n\t Mean Score: ", np.mean(float_list2))
+    print(f"Finished ApproximateQAgent {i}. \n\t Mean Score: ", np.mean(float_list2), "\n\t", qAgentScores.summary())
+    if targetWidth is not None and qAgentScores.interval() < targetWidth:
+        break
 
 # Averages score
-for i in range(len(qAgentScores)):
-    qAgentScores[i] /= amountOfRuns 
+qAgentScores = qAgentScores.means
 ########################################        
 ########################################
 numberOfEpisodes=500
@@ -83,28 +101,35 @@ command= [
         "python pacman.py -p ActorCriticAgent -n {0} -x {1} -a alpha_theta=0.25,alpha_w=0.15,gamma=0.9 -q -l {2}".format(numberOfEpisodes, trainEpisodes, randomLayout)
     ]
 
-actorCriticScores = [0]*numberOfEpisodes
+actorCriticScores = ScoreAggregator(numberOfEpisodes)
 for i in range(amountOfRuns):
-    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True)
-    print("ActorCriticAgent stderr: ", result.stderr)
+    key = experimentKey("ActorCriticAgent", "alpha_theta=0.25,alpha_w=0.15,gamma=0.9", randomLayout, None, numberOfEpisodes, trainEpisodes, f"run-{i}")
+    float_list3 = loadResult(key) if useResultCache else None
+    if float_list3 is None:
+        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True)
+        print("ActorCriticAgent stderr: ", result.stderr)
         
-    float_list3 = []
-    for line in result.stdout.decode('utf-8').splitlines():
-        if 'Scores:' in line:
-            value1 = (line.split(":")[1].strip())  # Extract integer value
-            value2 = (value1.split(", "))
-            float_list3=[float(value) for value in value2] 
+        float_list3 = []
+        for line in result.stdout.decode('utf-8').splitlines():
+            if 'Scores:' in line:
+                value1 = (line.split(":")[1].strip())  # Extract integer value
+                value2 = (value1.split(", "))
+                float_list3=[float(value) for value in value2] 
+        if float_list3:
+            saveResult(key, float_list3)
 
-    for j in range(len(float_list3)):
-        actorCriticScores[j] += float_list3[j]
+    actorCriticScores.add(i, float_list3)
 
-    print(f"Finished ActorCriticAgent {i}. \n\t Mean Score: ", np.mean(float_list3))
+    print(f"Finished ActorCriticAgent {i}. \n\t Mean Score: ", np.mean(float_list3), "\n\t", actorCriticScores.summary())
+    if targetWidth is not None and actorCriticScores.interval() < targetWidth:
+        break
 
 # Averages score
-for i in range(len(actorCriticScores)):
-    actorCriticScores[i] /= amountOfRuns 
+actorCriticScores = actorCriticScores.means
 ##################################
 #Plot the episodes
+# Imported only now, so the runs start without waiting for matplotlib
+import matplotlib.pyplot as plt  # Common import for matplotlib
 i=np.arange(len(reinforceScores))
 plt.plot(i,reinforceScores,'r',label="REINFORCE Agent")
 plt.plot(i,qAgentScores,'k',label="Approximate QLeaning Agent")
@@ -113,7 +138,7 @@ plt.plot(i,actorCriticScores,'b',label="Actor Critic Agent")
 plt.title('Learning Methods Convergence')
 plt.xticks(i[::100])
 plt.xlabel('Episodes')
-plt.ylabel(f'Average Score Over {amountOfRuns} runs.')
+plt.ylabel('Average Score Over Runs')
 plt.legend()
 plt.savefig('learning_methods.png')
 plt.savefig("../analysis/convergence.png")
@@ -126,6 +151,7 @@ Methods = {
     'Actor-Critic': actorCriticScores
 }
 def finalttest(data_dict, alpha=0.05):
+    from scipy import stats
     # Get all unique pairs of keys and their corresponding lists
     key_pairs = list(combinations(data_dict.keys(), 2))
     results = {}
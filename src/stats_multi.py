@@ -1,11 +1,17 @@
+import queue
 import subprocess
 import threading
-import matplotlib.pyplot as plt  
 import numpy as np
 import os
-from scipy import stats
 from itertools import combinations
 import random
+from bootstrapAnalysis import analyzeCells, printComparisons
+from experiments import AGENTS
+from layoutCompiler import compileLayoutFile
+from resultCache import experimentKey, loadResult, saveResult
+from resultsStore import RESULTS_DIR
+from runAggregation import ScoreAggregator, SequentialStopping
+from sweepJournal import JOURNAL_DIR, SweepJournal
 
 filenames=os.listdir("layouts")
 val2=[]
@@ -20,156 +26,272 @@ trainEpisodes = 00
 randomLayout = random.choice(layouts)
 numberOfGhosts = random.randrange(1, 5, 1)
 outputFileName = "random3"
-
-def reinforceAgent(numOfRuns, results):
-    command= [
-        "python pacman.py -p ReinforceAgent -n {0} -x {1} -a alpha=0.2,gamma=0.8 -q -l {2} ".format(episodeCount, trainEpisodes, randomLayout)
-    ]
-
-    if numberOfGhosts is not None:
-        command.append(f"-g {numberOfGhosts}")
-
-    for i in range(numOfRuns):
-        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True)
-        print("ReinforceAgent stderr: ", result.stderr)
-        
-        float_list1 = []
-        for line in result.stdout.decode('utf-8').splitlines():
-            if 'Scores:' in line:
-                value1 = (line.split(":")[1].strip())  # Extract integer value
-                value2 = (value1.split(", "))
-                float_list1=[float(value) for value in value2] 
-
-        for j in range(len(float_list1)):
-            results[j] += float_list1[j]
-
-        print(f"Finished reinforce {i}. \n\t Mean Score: ", np.mean(float_list1))
-
-def qLearningAgent(numOfRuns, results):
-    command= [
-        "python pacman.py -p ApproximateQAgent -a extractor=SimpleExtractor -n {0} -x {1} -q -l {2}".format(episodeCount, trainEpisodes, randomLayout)
-    ]
+# When True, all runs of an agent learn into one shared ParameterStore instead of starting from scratch
+shareParameters = False
+# When True, run i of every agent faces the same ghost random streams (seed baseSeed + i) and
+# the agents are compared with paired t-tests on their per-run mean scores
+commonRandomNumbers = False
+baseSeed = 0
+# Serve runs whose agent code and configuration are unchanged from the result cache
+useResultCache = True
+# Journal every finished run to journals/<outputFileName>.jsonl and resume from it when it exists
+journalSweeps = True
+# With commonRandomNumbers, every run also checkpoints every checkpointEvery games and an
+# interrupted run continues from its checkpoint (0 turns it off)
+checkpointEvery = 0
+# With commonRandomNumbers, every played run adds its per-episode results to the store in src/results
+storeResults = True
+
+# Stop handing out runs once every pair of agents is decided by the sequential test
+# (or every confidence interval is narrower than +/- targetWidth, when it is set)
+earlyStopping = True
+minRuns = 5
+targetWidth = None
+alpha = 0.05
+
+# Set when the comparison is answered, the processes of the runs still playing are killed
+stopRuns = threading.Event()
+runningProcesses = set()
+processLock = threading.Lock()
+
+def playRun(agentName, agentArgs, runIndex, extraAgentArgs="", checkpointFile=None):
+    """
+      Plays one run of an agent in its own process and returns its scores,
+      or None when the run was cancelled.  With commonRandomNumbers, run i
+      of every agent uses seed baseSeed + i and checkpoints to
+      checkpointFile when checkpointEvery is set and adds its episodes to
+      the results store when storeResults is set.
+    """
+    if commonRandomNumbers:
+        runner = "python experiments.py -s {0}".format(baseSeed + runIndex)
+        if checkpointFile is not None and checkpointEvery > 0:
+            runner += " -c {0} --checkpointEvery {1}".format(checkpointFile, checkpointEvery)
+        if storeResults:
+            runner += " -o {0}".format(RESULTS_DIR)
+    else:
+        runner = "python pacman.py"
+    command = "{0} -p {1} -n {2} -x {3} -a {4}{5} -q -l {6}".format(
+        runner, agentName, episodeCount, trainEpisodes, agentArgs, extraAgentArgs, randomLayout)
 
     if numberOfGhosts is not None:
-        command.append(f"-g {numberOfGhosts}")
-
-    for i in range(numOfRuns):
-        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True)
-        print("ApproximateQAgent stderr: ", result.stderr)
-        
-        float_list1 = []
-        for line in result.stdout.decode('utf-8').splitlines():
-            if 'Scores:' in line:
-                value1 = (line.split(":")[1].strip())  # Extract integer value
-                value2 = (value1.split(", "))
-                float_list1=[float(value) for value in value2] 
-
-        for j in range(len(float_list1)):
-            results[j] += float_list1[j]
-
-        print(f"Finished ApproximateQAgent {i}. \n\t Mean Score: ", np.mean(float_list1))
-
-def actorCriticAgent(numOfRuns, results):
-    command= [
-        "python pacman.py -p ActorCriticAgent -n {0} -x {1} -a alpha_theta=0.25,alpha_w=0.15,gamma=0.9 -q -l {2}".format(episodeCount, trainEpisodes, randomLayout)
-    ]
-
-    if numberOfGhosts is not None:
-        command.append(f"-g {numberOfGhosts}")
-
-    for i in range(numOfRuns):
-        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True)
-        print("ActorCriticAgent stderr: ", result.stderr)
-        
-        float_list1 = []
-        for line in result.stdout.decode('utf-8').splitlines():
-            if 'Scores:' in line:
-                value1 = (line.split(":")[1].strip())  # Extract integer value
-                value2 = (value1.split(", "))
-                float_list1=[float(value) for value in value2] 
-
-        for j in range(len(float_list1)):
-            results[j] += float_list1[j]
-
-        print(f"Finished ActorCriticAgent {i}. \n\t Mean Score: ", np.mean(float_list1))
-
-def finalttest(data_dict, alpha=0.05):
-    # Get all unique pairs of keys and their corresponding lists
-    key_pairs = list(combinations(data_dict.keys(), 2))
+        command += f" -k {numberOfGhosts}"
+
+    # Runs learning into a shared store depend on the other runs, they are never cached
+    key = None
+    if useResultCache and not shareParameters:
+        seed = baseSeed + runIndex if commonRandomNumbers else f"run-{runIndex}"
+        key = experimentKey(agentName, agentArgs, randomLayout, numberOfGhosts, episodeCount, trainEpisodes, seed)
+        cached = loadResult(key)
+        if cached is not None:
+            print(f"{agentName} {runIndex} served from the result cache")
+            return cached
+
+    with processLock:
+        if stopRuns.is_set():
+            return None
+        process = subprocess.Popen(command.split(), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        runningProcesses.add(process)
+    stdout, stderr = process.communicate()
+    with processLock:
+        runningProcesses.discard(process)
+    if stopRuns.is_set():
+        return None
+    print(f"{agentName} stderr: ", stderr)
+
+    float_list1 = []
+    for line in stdout.decode('utf-8').splitlines():
+        if 'Scores:' in line:
+            value1 = (line.split(":")[1].strip())  # Extract integer value
+            value2 = (value1.split(", "))
+            float_list1=[float(value) for value in value2]
+    if key is not None and float_list1:
+        saveResult(key, float_list1)
+    return float_list1
+
+def cancelRuns():
+    with processLock:
+        stopRuns.set()
+        for process in runningProcesses:
+            process.kill()
+
+def foldRun(agentName, i, float_list1, aggregators, runScores, stopping):
+    aggregators[agentName].add(i, float_list1)
+    runScores[agentName][i] = float_list1
+    print(f"Finished {agentName} {i}. \n\t Mean Score: ", np.mean(float_list1),
+        "\n\t", aggregators[agentName].summary())
+    if stopping is not None and not stopRuns.is_set() and stopping.update(aggregators):
+        cancelRuns()
+
+def runWorker(jobs, aggregators, runScores, stopping, extraAgentArgs, journal, lock):
+    """
+      Plays queued (agentName, runIndex) jobs until the queue is empty or
+      the comparison is answered, journaling every finished run, folding
+      it into its agent's aggregator and keeping its scores in runScores
+    """
+    while not stopRuns.is_set():
+        try:
+            agentName, i = jobs.get_nowait()
+        except queue.Empty:
+            return
+        checkpointFile = journal.checkpointPath(agentName, i) if journal is not None else None
+        float_list1 = playRun(agentName, AGENTS[agentName], i, extraAgentArgs[agentName], checkpointFile)
+        if not float_list1:
+            continue
+
+        if journal is not None:
+            journal.recordRun(agentName, i, float_list1)
+        with lock:
+            foldRun(agentName, i, float_list1, aggregators, runScores, stopping)
+
+def pairedttest(runMeans, alpha=0.05):
+    """
+      Paired t-tests between agents run with common random numbers, pairing
+      the mean scores of the runs that used the same seed
+    """
+    from scipy import stats
     results = {}
-    
-    # Perform t-tests for each pair
-    for key1, key2 in key_pairs:
-        t_stat, p_value = stats.ttest_ind(data_dict[key1], data_dict[key2])
-        
+    for key1, key2 in combinations(runMeans.keys(), 2):
+        runIndices = sorted(set(runMeans[key1]) & set(runMeans[key2]))
+        differences = [runMeans[key1][i] - runMeans[key2][i] for i in runIndices]
+        t_stat, p_value = stats.ttest_rel([runMeans[key1][i] for i in runIndices], [runMeans[key2][i] for i in runIndices])
+
         pair_name = f"{key1} vs {key2}"
         results[pair_name] = {
             "t_stat": t_stat,
             "p_value": p_value,
             "significant": p_value < alpha,
-            "message": f'There is {"a significant" if p_value < alpha else "no significant"} difference between the means of {key1} and {key2}'
+            "mean_difference": np.mean(differences),
+            "message": f'There is {"a significant" if p_value < alpha else "no significant"} difference between the means of {key1} and {key2} over {len(runIndices)} paired runs'
         }
 
     return results
 
 def main():
+    global randomLayout, numberOfGhosts
     numOfRuns = 48
     maxThreads = os.cpu_count()
-    agentFunctions = [reinforceAgent, qLearningAgent, actorCriticAgent]
-    results = []
-
-    print("Cores: ", maxThreads, "\nRuns Per Core: ", round(numOfRuns / maxThreads))
-
-    for function in agentFunctions:
-        functionResults = [0] * (episodeCount - trainEpisodes)
-        numOfRunsPerCore = round(numOfRuns / maxThreads)
-
-        allocatedRuns = 0
-        threads = []
-        for _ in range(maxThreads):
-            runs = min(numOfRunsPerCore, numOfRuns - allocatedRuns)
-            thread = threading.Thread(target=function, args=(runs, functionResults))
-            thread.start()
-            threads.append(thread)
-            allocatedRuns += runs
-
+    agentNames = list(AGENTS)
+
+    journal = None
+    if journalSweeps:
+        config = {"layout": randomLayout, "numberOfGhosts": numberOfGhosts, "episodeCount": episodeCount,
+            "trainEpisodes": trainEpisodes, "agents": AGENTS, "numOfRuns": numOfRuns,
+            "commonRandomNumbers": commonRandomNumbers, "baseSeed": baseSeed}
+        journal = SweepJournal(os.path.join(JOURNAL_DIR, outputFileName + ".jsonl"), config)
+        # The layout and ghost count are drawn at random, a resumed sweep keeps the ones it started with
+        randomLayout, numberOfGhosts = journal.config["layout"], journal.config["numberOfGhosts"]
+        for key, value in config.items():
+            if key not in ("layout", "numberOfGhosts") and journal.config.get(key) != value:
+                raise Exception(f"{journal.path} is a sweep with a different {key}, move it away to start a new one")
+        if journal.completed:
+            print(f"Resuming {journal.path}: {len(journal.completed)} runs on {randomLayout} with {numberOfGhosts} ghosts are done")
+
+    print("Cores: ", maxThreads, "\nRuns Per Core: ", round(numOfRuns * len(agentNames) / maxThreads))
+
+    # Compile once up front so every pacman.py run memory maps the same artifact
+    compileLayoutFile(os.path.join("layouts", randomLayout + ".lay"))
+
+    stores = []
+    extraAgentArgs = dict((agentName, "") for agentName in agentNames)
+    if shareParameters:
+        from parameterStore import createAgentStore
+        for agentName in agentNames:
+            store = createAgentStore(agentName)
+            stores.append(store)
+            extraAgentArgs[agentName] = ",parameterStore=" + store.name
+
+    aggregators = dict((agentName, ScoreAggregator(episodeCount - trainEpisodes)) for agentName in agentNames)
+    runScores = dict((agentName, {}) for agentName in agentNames)
+    stopping = None
+    if earlyStopping:
+        stopping = SequentialStopping(agentNames, numOfRuns, alpha, targetWidth, minRuns, commonRandomNumbers)
+
+    # Runs of the agents are interleaved so the comparison can be decided before every run is played,
+    # runs already in the journal are folded in instead of played
+    stopRuns.clear()
+    jobs = queue.Queue()
+    for i in range(numOfRuns):
+        for agentName in agentNames:
+            if journal is not None and (agentName, i) in journal.completed:
+                foldRun(agentName, i, journal.completed[(agentName, i)], aggregators, runScores, stopping)
+            elif not stopRuns.is_set():
+                jobs.put((agentName, i))
+
+    lock = threading.Lock()
+    threads = []
+    for _ in range(maxThreads):
+        thread = threading.Thread(target=runWorker, args=(jobs, aggregators, runScores, stopping, extraAgentArgs, journal, lock))
+        thread.start()
+        threads.append(thread)
+
+    try:
         for thread in threads:
             thread.join()
+    except KeyboardInterrupt:
+        # Everything finished is in the journal, the runs still playing are redone on resume
+        cancelRuns()
+        raise
+    finally:
+        if journal is not None:
+            journal.close()
+
+    # Finished when every run is in or the comparison was decided, failed runs keep the sweep resumable
+    if journal is not None and (stopRuns.is_set() or len(journal.completed) == numOfRuns * len(agentNames)):
+        print(f"Sweep finished, its journal is kept as {journal.finish()}")
 
-        for i in range(len(functionResults)):
-            functionResults[i] /= numOfRuns
+    for store in stores:
+        store.close()
 
-        results.append(functionResults)
+    for agentName in agentNames:
+        print(agentName, aggregators[agentName].summary())
 
+    results = [aggregators[agentName].means for agentName in agentNames]
+    runCounts = [aggregators[agentName].runCount for agentName in agentNames]
+
+    # Imported here so the workers are busy before matplotlib loads
+    import matplotlib.pyplot as plt
     i=np.arange(len(results[0]))
-    plt.plot(i,results[0],'r',label="REINFORCE Agent")
-    plt.plot(i,results[1],'k',label="Approximate QLearning Agent")
-    plt.plot(i,results[2],'b',label="Actor Critic Agent")
+    plt.plot(i,results[0],'r',label=f"REINFORCE Agent ({runCounts[0]} runs)")
+    plt.plot(i,results[1],'k',label=f"Approximate QLearning Agent ({runCounts[1]} runs)")
+    plt.plot(i,results[2],'b',label=f"Actor Critic Agent ({runCounts[2]} runs)")
 
     plt.title(f'Learning Methods Convergence on {randomLayout} Layout with {numberOfGhosts} Ghosts')
     plt.xticks(i[::int(round((episodeCount - trainEpisodes)/4))])
     plt.xlabel('Episodes')
-    plt.ylabel(f'Average Score Over {numOfRuns} runs.')
+    plt.ylabel('Average Score Over Runs')
     plt.legend()
     plt.savefig(f"../analysis/{outputFileName}.png")
 
     #################################
-    # T-test Statistics
+    # Paired bootstrap over the runs every agent finished
     Methods = {
         'Reinforcement': results[0],
         'QLearning': results[1],
         'Actor-Critic': results[2]
     }
 
-    testResults = finalttest(Methods)
-
-    for key, value in testResults.items():
-        print(key)
-        print("T-statistic:", value["t_stat"])
-        print("P-value:", value["p_value"])
-        print(value["message"])
-        print("Significant:", value["significant"])
-        print()
+    runIndices = sorted(set.intersection(*[set(runScores[agentName]) for agentName in agentNames]))
+    scores = {}
+    for name, agentName in zip(Methods.keys(), agentNames):
+        scores[name] = np.full((len(runIndices), episodeCount - trainEpisodes), np.nan)
+        for row, i in enumerate(runIndices):
+            scores[name][row, :len(runScores[agentName][i])] = runScores[agentName][i][:episodeCount - trainEpisodes]
+
+    printComparisons(analyzeCells({(randomLayout, numberOfGhosts): scores}, alpha=alpha))
+
+    if commonRandomNumbers:
+        runMeans = {}
+        for name, agentName in zip(Methods.keys(), agentNames):
+            runMeans[name] = aggregators[agentName].runMeans
+
+        for key, value in pairedttest(runMeans).items():
+            print(key, "(paired over common random numbers)")
+            print("Mean difference:", value["mean_difference"])
+            print("T-statistic:", value["t_stat"])
+            print("P-value:", value["p_value"])
+            print(value["message"])
+            print("Significant:", value["significant"])
+            print()
 
 
 if __name__=="__main__":
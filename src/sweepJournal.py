@@ -0,0 +1,110 @@
+import json
+import os
+import threading
+import time
+
+JOURNAL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'journals')
+
+class SweepJournal:
+    """
+      Append-only JSON lines file of a sweep.  The first line holds the
+      sweep's configuration and every later line one finished run, written
+      and flushed to disk as soon as the run is done, so a crash loses at
+      most the runs still playing.
+
+      Opening an existing journal resumes it: config becomes the one it was
+      started with and the finished runs are read back into completed,
+      keyed by (agentName, runIndex).  A last line cut short by a crash is
+      ignored.  finish() marks a sweep whose every run is in and moves its
+      journal aside, so only unfinished sweeps are ever resumed.
+    """
+    def __init__(self, path, config):
+        self.path = path
+        self.completed = {}
+        self.finished = False
+        self.lock = threading.Lock()
+
+        resumed = None
+        if os.path.exists(path):
+            resumed = self.read()
+            if self.finished:
+                # Finished, but not moved aside yet, so this is a new sweep
+                self.archive()
+                resumed = None
+                self.completed = {}
+                self.finished = False
+
+        if resumed is not None:
+            self.config = resumed
+            self.file = open(path, 'a')
+            # Start past a line a crash cut short, so the next run does not land on it
+            if self.file.tell() > 0:
+                with open(path, 'rb') as f:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b'\n':
+                        self.file.write('\n')
+        else:
+            self.config = dict(config)
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.file = open(path, 'w')
+            self.write({'sweep': self.config})
+
+    def read(self):
+        config = None
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if 'sweep' in entry:
+                    config = entry['sweep']
+                elif 'finished' in entry:
+                    self.finished = True
+                else:
+                    self.completed[(entry['agent'], entry['run'])] = entry['scores']
+        if config is None:
+            raise Exception('%s is not a sweep journal' % self.path)
+        return config
+
+    def write(self, entry):
+        with self.lock:
+            self.file.write(json.dumps(entry) + '\n')
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def recordRun(self, agentName, runIndex, scores):
+        self.completed[(agentName, runIndex)] = list(scores)
+        self.write({'agent': agentName, 'run': runIndex, 'scores': list(scores)})
+
+    def checkpointPath(self, agentName, runIndex):
+        """
+          Where a run of the sweep keeps its mid-run checkpoint
+        """
+        return '%s.%s-%d.json' % (os.path.splitext(self.path)[0], agentName, runIndex)
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+    def archive(self):
+        """
+          Moves the journal to <name>-<time>.jsonl next to it
+        """
+        archivePath = '%s-%s.jsonl' % (os.path.splitext(self.path)[0], time.strftime('%Y%m%d-%H%M%S'))
+        os.replace(self.path, archivePath)
+        return archivePath
+
+    def finish(self):
+        """
+          Marks the sweep finished and moves its journal aside, returns
+          where it went
+        """
+        if self.file.closed:
+            self.file = open(self.path, 'a')
+        self.write({'finished': True})
+        self.close()
+        self.finished = True
+        return self.archive()
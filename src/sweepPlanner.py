@@ -0,0 +1,291 @@
+import collections
+import functools
+import json
+import optparse
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from experiments import AGENTS
+from layoutCompiler import LAYOUT_DIR, compileLayoutFile, readLayoutText
+from resultCache import experimentKey, loadResult, saveResult
+from resultsStore import RESULTS_DIR
+
+GHOST_COUNTS = [1, 2, 3, 4]
+
+TIMINGS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'journals', 'timings.jsonl')
+
+Job = collections.namedtuple('Job', ['agentName', 'layoutName', 'numGhosts', 'runIndex'])
+
+@functools.lru_cache(maxsize=None)
+def layoutSize(layoutName):
+    """
+      Open squares and ghost starts of a layout, read from its .lay file
+    """
+    text = readLayoutText(os.path.join(LAYOUT_DIR, layoutName + '.lay'))
+    openSquares = sum(1 for line in text for char in line if char != '%')
+    ghosts = sum(1 for line in text for char in line if char in 'G1234')
+    return openSquares, ghosts
+
+def allLayouts():
+    return sorted(f[:-4] for f in os.listdir(LAYOUT_DIR) if f.endswith('.lay'))
+
+def expandMatrix(agentNames, layoutNames, ghostCounts, numRuns):
+    """
+      Every run of every agent on every layout with every ghost count.
+      Ghost counts above what a layout has room for play the same game as
+      the layout's maximum, so they are skipped.
+    """
+    jobs = []
+    for layoutName in layoutNames:
+        maxGhosts = layoutSize(layoutName)[1]
+        for numGhosts in ghostCounts:
+            if numGhosts > maxGhosts:
+                continue
+            for agentName in agentNames:
+                jobs.extend(Job(agentName, layoutName, numGhosts, i) for i in range(numRuns))
+    return jobs
+
+class CostModel:
+    """
+      Estimated seconds per episode of every (agent, layout, ghosts) cell.
+
+      Cells this planner timed before (TIMINGS_FILE) use the median of
+      their timings, the wall time of the whole run divided by its games,
+      start up and training games included, since that is what a worker
+      spends on it.  The results store's in-game episode times are not
+      mixed in, they measure something else.  Other cells
+      scale the agent's median seconds per (open square x (ghosts + 1))
+      over the timed cells, since every move costs the agent feature work
+      over the maze and every ghost adds a move per round.  Without any
+      timing every cell gets that size as its cost, which still orders
+      them for longest-first scheduling.
+    """
+    def __init__(self, timingsFile=TIMINGS_FILE):
+        self.timingsFile = timingsFile
+        self.timings = collections.defaultdict(list)
+        self.lock = threading.Lock()
+
+        if timingsFile is not None and os.path.exists(timingsFile):
+            with open(timingsFile) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    self.timings[(entry['agent'], entry['layout'], entry['numGhosts'])].append(entry['secondsPerEpisode'])
+
+    def timed(self):
+        return any(self.timings.values())
+
+    def size(self, layoutName, numGhosts):
+        return layoutSize(layoutName)[0] * (numGhosts + 1)
+
+    def secondsPerEpisode(self, agentName, layoutName, numGhosts):
+        key = (agentName, layoutName, numGhosts)
+        if self.timings[key]:
+            return statistics.median(self.timings[key])
+
+        rates = [statistics.median(seconds) / self.size(layout, ghosts)
+            for (agent, layout, ghosts), seconds in list(self.timings.items()) if seconds and agent == agentName]
+        if not rates:
+            rates = [statistics.median(seconds) / self.size(layout, ghosts)
+                for (agent, layout, ghosts), seconds in list(self.timings.items()) if seconds]
+        rate = statistics.median(rates) if rates else 1.0
+        return rate * self.size(layoutName, numGhosts)
+
+    def record(self, job, secondsPerEpisode):
+        """
+          Adds the timing of a finished run, to this model and to the file
+        """
+        with self.lock:
+            self.timings[(job.agentName, job.layoutName, job.numGhosts)].append(secondsPerEpisode)
+            if self.timingsFile is not None:
+                os.makedirs(os.path.dirname(self.timingsFile), exist_ok=True)
+                with open(self.timingsFile, 'a') as f:
+                    f.write(json.dumps({'agent': job.agentName, 'layout': job.layoutName,
+                        'numGhosts': job.numGhosts, 'secondsPerEpisode': secondsPerEpisode}) + '\n')
+
+def longestFirst(jobs, costs, numWorkers):
+    """
+      Longest processing time first: jobs sorted by decreasing cost, each
+      given to the worker with the least work so far.  Returns the
+      workers' queues and their planned loads.
+    """
+    queues = [collections.deque() for _ in range(numWorkers)]
+    loads = [0.0] * numWorkers
+    for job in sorted(jobs, key=lambda job: costs[job], reverse=True):
+        worker = loads.index(min(loads))
+        queues[worker].append(job)
+        loads[worker] += costs[job]
+    return queues, loads
+
+def staticSplit(jobs, costs, numWorkers):
+    """
+      Planned loads of splitting the jobs evenly by count, in matrix order,
+      the way stats_multi.py splits its runs
+    """
+    perWorker = -(-len(jobs) // numWorkers)
+    return [sum(costs[job] for job in jobs[i:i + perWorker]) for i in range(0, len(jobs), perWorker)]
+
+class WorkStealingPool:
+    """
+      Runs the longestFirst queues with one thread per worker, each playing
+      its jobs in their own process.  A worker whose queue runs dry steals
+      the cheapest job left from the most loaded other queue, so estimates
+      that were off do not leave workers idle while others still have a
+      backlog.
+    """
+    def __init__(self, queues, costs, runJob):
+        self.queues = queues
+        self.costs = costs
+        self.runJob = runJob
+        self.lock = threading.Lock()
+        self.steals = 0
+
+    def nextJob(self, worker):
+        with self.lock:
+            if self.queues[worker]:
+                return self.queues[worker].popleft()
+            victims = [queue for queue in self.queues if queue]
+            if not victims:
+                return None
+            victim = max(victims, key=lambda queue: sum(self.costs[job] for job in queue))
+            self.steals += 1
+            return victim.pop()
+
+    def work(self, worker):
+        while True:
+            job = self.nextJob(worker)
+            if job is None:
+                return
+            self.runJob(job)
+
+    def run(self):
+        threads = [threading.Thread(target=self.work, args=(worker,)) for worker in range(len(self.queues))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+class Sweep:
+    """
+      Plays every job with experiments.py, seeded by baseSeed + the run
+      index so every agent of a cell faces the same ghosts, and serves
+      unchanged runs from the result cache
+    """
+    def __init__(self, numGames, numTraining, baseSeed, costModel, resultsDir=RESULTS_DIR):
+        self.numGames = numGames
+        self.numTraining = numTraining
+        self.baseSeed = baseSeed
+        self.costModel = costModel
+        self.resultsDir = resultsDir
+        self.scores = {}
+        self.lock = threading.Lock()
+
+    def runJob(self, job):
+        agentArgs = AGENTS[job.agentName]
+        seed = self.baseSeed + job.runIndex
+        key = experimentKey(job.agentName, agentArgs, job.layoutName, job.numGhosts, self.numGames, self.numTraining, seed)
+        scores = loadResult(key)
+
+        if scores is None:
+            command = ['python', 'experiments.py', '-p', job.agentName, '-a', agentArgs, '-l', job.layoutName,
+                '-k', str(job.numGhosts), '-n', str(self.numGames), '-x', str(self.numTraining), '-s', str(seed)]
+            if self.resultsDir is not None:
+                command += ['-o', self.resultsDir]
+            startTime = time.time()
+            result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            elapsed = time.time() - startTime
+
+            scores = []
+            for line in result.stdout.decode('utf-8').splitlines():
+                if 'Scores:' in line:
+                    scores = [float(value) for value in line.split(':')[1].strip().split(', ')]
+            if not scores:
+                print('%s failed: %s' % (self.describe(job), result.stderr.decode('utf-8').strip()))
+                return
+            saveResult(key, scores)
+            self.costModel.record(job, elapsed / self.numGames)
+
+        with self.lock:
+            self.scores[job] = scores
+            print('Finished %s, mean score %.1f' % (self.describe(job), sum(scores) / len(scores)))
+
+    def describe(self, job):
+        return '%s on %s with %d ghosts, run %d' % job
+
+def readCommand(argv):
+    """
+      Processes the command used to run a grid sweep from the command line.
+    """
+    usageStr = """
+    USAGE:      python sweepPlanner.py <options>
+    EXAMPLES:   (1) python sweepPlanner.py --plan
+                    - prints the longest-first plan of every agent on every layout and ghost count
+                (2) python sweepPlanner.py -l smallClassic,mediumClassic -r 10 -n 100 -j 8
+                    - plays the sweep on 8 workers
+    """
+    parser = optparse.OptionParser(usageStr)
+    parser.add_option('-p', '--agents', dest='agents', default=','.join(AGENTS),
+                      help='comma separated agents to sweep')
+    parser.add_option('-l', '--layouts', dest='layouts', default=None,
+                      help='comma separated layouts to sweep (default: every layout in layouts)')
+    parser.add_option('-k', '--numghosts', dest='ghostCounts', default=','.join(str(k) for k in GHOST_COUNTS),
+                      help='comma separated ghost counts to sweep')
+    parser.add_option('-r', '--runs', dest='numRuns', type='int', default=10,
+                      help='the number of runs of every cell')
+    parser.add_option('-n', '--numGames', dest='numGames', type='int', default=100,
+                      help='the number of games of every run', metavar='GAMES')
+    parser.add_option('-x', '--numTraining', dest='numTraining', type='int', default=0,
+                      help='How many episodes are training (suppresses output)')
+    parser.add_option('-s', '--seed', dest='seed', type='int', default=0,
+                      help='run i of every cell is seeded with seed + i')
+    parser.add_option('-j', '--workers', dest='numWorkers', type='int', default=os.cpu_count(),
+                      help='the number of runs played at once')
+    parser.add_option('--plan', action='store_true', dest='plan', default=False,
+                      help='only print the plan and its predicted makespan')
+
+    options, otherjunk = parser.parse_args(argv)
+    if len(otherjunk) != 0:
+        raise Exception('Command line input not understood: ' + str(otherjunk))
+    for agentName in options.agents.split(','):
+        if agentName not in AGENTS:
+            raise Exception('No sweep configuration for the agent ' + agentName)
+    return options
+
+if __name__ == '__main__':
+    options = readCommand(sys.argv[1:])
+    layoutNames = options.layouts.split(',') if options.layouts else allLayouts()
+    jobs = expandMatrix(options.agents.split(','), layoutNames, [int(k) for k in options.ghostCounts.split(',')], options.numRuns)
+
+    costModel = CostModel()
+    costs = dict((job, options.numGames * costModel.secondsPerEpisode(job.agentName, job.layoutName, job.numGhosts)) for job in jobs)
+    queues, loads = longestFirst(jobs, costs, options.numWorkers)
+    print('%d runs over %d cells on %d workers' % (len(jobs), len(set(job[:3] for job in jobs)), options.numWorkers))
+    # Without timings the costs are layout sizes, only their ratios mean anything
+    unit = 's' if costModel.timed() else 'units'
+    print('Predicted makespan: %.1f %s longest first, %.1f %s split evenly, %.1f %s of work in total' % (
+        max(loads), unit, max(staticSplit(jobs, costs, options.numWorkers)), unit, sum(costs.values()), unit))
+    if options.plan:
+        for worker, queue in enumerate(queues):
+            print('Worker %d: %d runs, %.1f %s' % (worker, len(queue), loads[worker], unit))
+        sys.exit(0)
+
+    for layoutName in layoutNames:
+        compileLayoutFile(os.path.join(LAYOUT_DIR, layoutName + '.lay'))
+
+    sweep = Sweep(options.numGames, options.numTraining, options.seed, costModel)
+    pool = WorkStealingPool(queues, costs, sweep.runJob)
+    startTime = time.time()
+    pool.run()
+    print('Played %d runs in %.1f s with %d steals' % (len(sweep.scores), time.time() - startTime, pool.steals))
+
+    cells = collections.defaultdict(list)
+    for job, scores in sweep.scores.items():
+        cells[job[:3]].append(sum(scores) / len(scores))
+    for (agentName, layoutName, numGhosts), means in sorted(cells.items()):
+        print('%-18s %-16s %d ghosts: mean score %8.1f over %d runs' % (
+            agentName, layoutName, numGhosts, sum(means) / len(means), len(means)))
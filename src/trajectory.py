@@ -0,0 +1,94 @@
+import numpy as np
+
+# Pacman never has more than North, South, East, West and Stop available
+MAX_ACTIONS = 5
+
+class TrajectoryBuffer:
+    """
+      Per-episode storage for policy-gradient agents.
+
+      Only what the gradient needs is kept: for every step the feature
+      vectors of all legal actions, the index of the action that was taken
+      and the reward that followed.  The arrays are allocated up front and
+      doubled when an episode outgrows them, so no GameState has to be
+      held on to until the end of the episode.
+    """
+    def __init__(self, numFeatures, maxActions=MAX_ACTIONS, capacity=256):
+        self.numFeatures = numFeatures
+        self.maxActions = maxActions
+        self.features = np.zeros((capacity, maxActions, numFeatures))
+        self.numActions = np.zeros(capacity, dtype=np.int8)
+        self.actionIndices = np.zeros(capacity, dtype=np.int8)
+        self.rewards = np.zeros(capacity)
+        self.length = 0
+
+    def __len__(self):
+        return self.length
+
+    def clear(self):
+        """
+          Forget the stored steps but keep the allocated arrays
+        """
+        self.length = 0
+
+    def append(self, actionFeatures, actionIndex, reward):
+        """
+          actionFeatures: one feature vector per legal action
+          actionIndex: index into actionFeatures of the action taken
+          reward: reward observed after taking the action
+        """
+        if self.length == len(self.rewards):
+            self.grow()
+
+        t = self.length
+        numActions = len(actionFeatures)
+        self.features[t, :numActions] = actionFeatures
+        self.numActions[t] = numActions
+        self.actionIndices[t] = actionIndex
+        self.rewards[t] = reward
+        self.length += 1
+
+    def grow(self):
+        capacity = 2 * len(self.rewards)
+        self.features = self._resized(self.features, capacity)
+        self.numActions = self._resized(self.numActions, capacity)
+        self.actionIndices = self._resized(self.actionIndices, capacity)
+        self.rewards = self._resized(self.rewards, capacity)
+
+    def _resized(self, array, capacity):
+        resized = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+        resized[:self.length] = array[:self.length]
+        return resized
+
+    def step(self, t):
+        """
+          Returns (actionFeatures, actionIndex, reward) for step t, where
+          actionFeatures only has a row for each legal action of that step
+        """
+        return (self.features[t, :self.numActions[t]],
+            int(self.actionIndices[t]),
+            float(self.rewards[t]))
+
+    def arrays(self):
+        """
+          Compact copies of the stored steps, suitable for sending to
+          another process
+        """
+        maxActions = max(int(self.numActions[:self.length].max()), 1) if self.length > 0 else 1
+        return (self.features[:self.length, :maxActions].copy(),
+            self.numActions[:self.length].copy(),
+            self.actionIndices[:self.length].copy(),
+            self.rewards[:self.length].copy())
+
+    @classmethod
+    def fromArrays(cls, features, numActions, actionIndices, rewards, maxActions=MAX_ACTIONS):
+        """
+          Rebuilds a buffer from the output of arrays()
+        """
+        trajectory = cls(features.shape[2], maxActions, max(len(rewards), 1))
+        trajectory.features[:len(rewards), :features.shape[1]] = features
+        trajectory.numActions[:len(rewards)] = numActions
+        trajectory.actionIndices[:len(rewards)] = actionIndices
+        trajectory.rewards[:len(rewards)] = rewards
+        trajectory.length = len(rewards)
+        return trajectory